@@ -8,10 +8,58 @@ import shutil
 import platform
 import subprocess
 import re
+import fnmatch
 import ctypes
-import winreg
+import select
+import sqlite3
+import struct
+import mmap
+import bisect
+import heapq
+import copy
+import math
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 from datetime import datetime
 
+# Only available on Windows, used to list registry startup entries
+try:
+    import winreg
+except ImportError:
+    winreg = None
+
+# Optional C implementation of the Aho-Corasick automaton
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional YARA rule engine
+try:
+    import yara
+except ImportError:
+    yara = None
+
+# Optional NumPy, used for the entropy analysis
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Only available on POSIX systems, used for FIEMAP
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Optional PE parser
+try:
+    import pefile
+except ImportError:
+    pefile = None
+
 
 def resource_path(relative_path):
 
@@ -117,33 +165,75 @@ def apply_dark_theme(app):
 # Global variables
 APP_NAME = "ArcSentinel"
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_PATH = os.path.join(os.getenv('APPDATA'), APP_NAME)
-MALWARE_SIGNATURES_FILE = os.path.join(DATABASE_PATH, "signatures.json")
+# %APPDATA% only exists on Windows, elsewhere data goes to ~/.config
+DATABASE_PATH = os.path.join(os.getenv('APPDATA') or os.path.join(os.path.expanduser("~"), ".config"), APP_NAME)
+MALWARE_SIGNATURES_FILE = os.path.join(DATABASE_PATH, "signatures.db")
+SIGNATURES_JSON_FILE = os.path.join(DATABASE_PATH, "signatures.json")
+SIGNATURE_BLOOM_FILE = os.path.join(DATABASE_PATH, "signatures.bloom")
+SIGNATURE_MANIFEST_FILE = os.path.join(DATABASE_PATH, "signatures_manifest.json")
+SIGNATURE_JOURNAL_FILE = os.path.join(DATABASE_PATH, "signatures_delta.jsonl")
 QUARANTINE_FOLDER = os.path.join(DATABASE_PATH, "quarantine")
 SCAN_HISTORY_FILE = os.path.join(DATABASE_PATH, "scan_history.json")
 SETTINGS_FILE = os.path.join(DATABASE_PATH, "settings.json")
 LOG_FILE = os.path.join(DATABASE_PATH, "activity.log")
+SCAN_CACHE_FILE = os.path.join(DATABASE_PATH, "scan_cache.db")
+SCAN_TOTALS_FILE = os.path.join(DATABASE_PATH, "scan_totals.json")
+SCAN_INDEX_FILE = os.path.join(DATABASE_PATH, "scan_index.db")
+HEURISTIC_RULES_FILE = os.path.join(DATABASE_PATH, "heuristic_rules.json")
+YARA_RULES_FOLDER = os.path.join(DATABASE_PATH, "yara_rules")
+YARA_CACHE_FOLDER = os.path.join(DATABASE_PATH, "yara_cache")
 APP_ICON =  os.path.join(os.path.dirname(os.path.abspath(__file__)), "icon.ico")
 
 # Global settings dictionary
 settings = {}
 
+# Maximum number of files remembered by the scan verdict cache
+DEFAULT_SCAN_CACHE_ENTRIES = 500000
+
+# Files remembered by real-time protection, and how long an untouched one is kept
+DEFAULT_MONITOR_STATE_ENTRIES = 100000
+DEFAULT_MONITOR_STATE_MAX_AGE = 24 * 3600
+
+# Seconds a changed file must stay untouched before real-time protection scans it
+DEFAULT_REALTIME_SETTLE_SECONDS = 2.0
+
+# Subdirectory levels watched below a recursive real-time root, and the
+# most directories real-time protection will watch in total
+DEFAULT_WATCH_MAX_DEPTH = 8
+DEFAULT_REALTIME_MAX_WATCHES = 4096
+
+# Folders watched by real-time protection unless settings say otherwise
+def default_realtime_watch():
+    home = os.environ.get("USERPROFILE", os.path.expanduser("~"))
+    return [
+        {"path": os.path.join(home, "Downloads"), "recursive": True, "max_depth": 4},
+        {"path": os.path.join(home, "Desktop"), "recursive": True, "max_depth": 2},
+        {"path": os.environ.get("TEMP", os.path.join(home, "AppData", "Local", "Temp")), "recursive": True, "max_depth": 2}
+    ]
+
 # Ensure necessary directories exist
 def setup_directories():
     if not os.path.exists(DATABASE_PATH):
         os.makedirs(DATABASE_PATH)
     if not os.path.exists(QUARANTINE_FOLDER):
         os.makedirs(QUARANTINE_FOLDER)
+    if not os.path.exists(YARA_RULES_FOLDER):
+        os.makedirs(YARA_RULES_FOLDER)
     
     # Create default files if they don't exist
-    if not os.path.exists(MALWARE_SIGNATURES_FILE):
-        with open(MALWARE_SIGNATURES_FILE, 'w') as f:
+    if not os.path.exists(SIGNATURES_JSON_FILE):
+        with open(SIGNATURES_JSON_FILE, 'w') as f:
             json.dump({"md5": [], "sha1": [], "sha256": []}, f)
     
     if not os.path.exists(SCAN_HISTORY_FILE):
         with open(SCAN_HISTORY_FILE, 'w') as f:
             json.dump([], f)
     
+    if not os.path.exists(HEURISTIC_RULES_FILE):
+        save_heuristic_rules(DEFAULT_HEURISTIC_RULES)
+    else:
+        upgrade_heuristic_rules()
+    
     if not os.path.exists(SETTINGS_FILE):
         default_settings = {
             "real_time_protection": True,
@@ -153,7 +243,22 @@ def setup_directories():
             "update_frequency": "daily",
             "theme": "dark",
             "excluded_paths": [],
-            "last_update_check": None
+            "last_update_check": None,
+            "scan_cache_max_entries": DEFAULT_SCAN_CACHE_ENTRIES,
+            "scan_workers": os.cpu_count() or 1,
+            "scan_analyze_workers": max(1, (os.cpu_count() or 1) // 2),
+            "scan_use_processes": False,
+            "scan_max_inflight_mb": 256,
+            "bloom_false_positive_rate": 0.001,
+            "bloom_max_mb": 64,
+            "yara_timeout": 10,
+            "yara_max_timeouts": 3,
+            "scan_schedule": "auto",
+            "realtime_state_max_entries": DEFAULT_MONITOR_STATE_ENTRIES,
+            "realtime_state_max_age": DEFAULT_MONITOR_STATE_MAX_AGE,
+            "realtime_settle_seconds": DEFAULT_REALTIME_SETTLE_SECONDS,
+            "realtime_watch": default_realtime_watch(),
+            "realtime_max_watches": DEFAULT_REALTIME_MAX_WATCHES
         }
         with open(SETTINGS_FILE, 'w') as f:
             json.dump(default_settings, f)
@@ -190,7 +295,22 @@ def load_settings():
             "update_frequency": "daily",
             "theme": "dark",
             "excluded_paths": [],
-            "last_update_check": None
+            "last_update_check": None,
+            "scan_cache_max_entries": DEFAULT_SCAN_CACHE_ENTRIES,
+            "scan_workers": os.cpu_count() or 1,
+            "scan_analyze_workers": max(1, (os.cpu_count() or 1) // 2),
+            "scan_use_processes": False,
+            "scan_max_inflight_mb": 256,
+            "bloom_false_positive_rate": 0.001,
+            "bloom_max_mb": 64,
+            "yara_timeout": 10,
+            "yara_max_timeouts": 3,
+            "scan_schedule": "auto",
+            "realtime_state_max_entries": DEFAULT_MONITOR_STATE_ENTRIES,
+            "realtime_state_max_age": DEFAULT_MONITOR_STATE_MAX_AGE,
+            "realtime_settle_seconds": DEFAULT_REALTIME_SETTLE_SECONDS,
+            "realtime_watch": default_realtime_watch(),
+            "realtime_max_watches": DEFAULT_REALTIME_MAX_WATCHES
         }
         return settings
 
@@ -207,67 +327,2032 @@ def save_settings(new_settings=None):
         log_activity(f"Error saving settings: {str(e)}", "ERROR")
         return False
 
-# Load malware signatures
-def load_signatures():
+# Streaming hash settings
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB read buffer shared by all digests
+
+# Default rules written to the heuristic rule file on first run. Bump
+# HEURISTIC_RULES_VERSION when they change so existing rule files are merged.
+HEURISTIC_RULES_VERSION = 2
+DEFAULT_HEURISTIC_RULES = [
+    {"name": "CreateRemoteThread", "pattern": "CreateRemoteThread", "category": "api"},
+    {"name": "VirtualAllocEx", "pattern": "VirtualAllocEx", "category": "api"},
+    {"name": "WriteProcessMemory", "pattern": "WriteProcessMemory", "category": "api"},
+    {"name": "ShellExecute", "pattern": "ShellExecute", "category": "api"},
+    {"name": "WScript.Shell", "pattern": "WScript.Shell", "category": "script"},
+    {"name": "cmd.exe /c", "pattern": "cmd.exe /c", "category": "command"},
+    {"name": "powershell -e", "pattern": "powershell -e", "category": "command"},
+    {"name": "net user /add", "pattern": "net user /add", "category": "command"},
+    {"name": "Run key persistence", "pattern": "reg add HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Run", "category": "command", "weight": 100},
+    {"name": "FromBase64String", "pattern": "FromBase64String", "category": "script"},
+    {"name": "EncodedCommand", "pattern": "-EncodedCommand", "category": "script"},
+    {"name": "Invoke-Expression", "pattern": "Invoke-Expression", "category": "script"},
+    {"name": "DownloadString", "pattern": "DownloadString", "category": "script"},
+    {"name": "String.fromCharCode", "pattern": "String.fromCharCode", "category": "script"},
+    {"name": "ActiveXObject", "pattern": "ActiveXObject", "category": "script"}
+]
+
+# File type detection. Only the first FILE_TYPE_HEADER_SIZE bytes are used.
+FILE_TYPE_HEADER_SIZE = 512
+SCRIPT_EXTENSIONS = [".bat", ".cmd", ".ps1", ".psm1", ".vbs", ".vbe", ".js", ".jse",
+                     ".wsf", ".hta", ".sh", ".py", ".pl", ".rb"]
+EXECUTABLE_EXTENSIONS = [".exe", ".dll", ".sys", ".scr", ".com", ".cpl", ".ocx", ".jar", ".msi"]
+# Types that only get a signature check, without heuristics or YARA
+HASH_ONLY_FILE_TYPES = ["media"]
+MEDIA_SIGNATURES = [
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff",
+    b"GIF87a",
+    b"GIF89a",
+    b"ID3",
+    b"OggS",
+    b"fLaC",
+    b"\x1aE\xdf\xa3",
+    b".snd"
+]
+
+# Calculate MD5, SHA-1 and SHA-256 in a single pass over fixed-size chunks.
+# on_chunk is called with a memoryview of every chunk; it is only valid
+# until the callback returns because the read buffer is reused.
+def hash_file(file_path, on_chunk=None):
+    md5 = hashlib.md5()
+    sha1 = hashlib.sha1()
+    sha256 = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            chunk = view[:read]
+            md5.update(chunk)
+            sha1.update(chunk)
+            sha256.update(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+    
+    return {
+        "md5": md5.hexdigest(),
+        "sha1": sha1.hexdigest(),
+        "sha256": sha256.hexdigest()
+    }
+
+# Multi-pattern matcher (Aho-Corasick) used by the heuristic analysis.
+# All patterns are found in a single pass over the data, so the cost per
+# byte does not grow with the number of rules.
+class PatternMatcher:
+    def __init__(self, patterns):
+        self.patterns = [bytes(pattern) for pattern in patterns if pattern]
+        self.lengths = [len(pattern) for pattern in self.patterns]
+        self.max_length = max(self.lengths) if self.patterns else 0
+        self.automaton = None
+        if not self.patterns:
+            return
+        if ahocorasick is not None:
+            # C implementation, works on text so bytes are mapped 1:1 through latin-1
+            self.automaton = ahocorasick.Automaton()
+            for index, pattern in enumerate(self.patterns):
+                self.automaton.add_word(pattern.decode("latin-1"), index)
+            self.automaton.make_automaton()
+        else:
+            self.build()
+    
+    def build(self):
+        # Goto trie
+        self.goto = [{}]
+        self.output = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for byte in pattern:
+                next_state = self.goto[state].get(byte)
+                if next_state is None:
+                    self.goto.append({})
+                    self.output.append([])
+                    next_state = len(self.goto) - 1
+                    self.goto[state][byte] = next_state
+                state = next_state
+            self.output[state].append(index)
+        
+        # Failure links, breadth first so shorter states are always done first
+        self.fail = [0] * len(self.goto)
+        pending = list(self.goto[0].values())
+        for state in pending:
+            for byte, next_state in self.goto[state].items():
+                pending.append(next_state)
+                fallback = self.fail[state]
+                while fallback and byte not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(byte, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+        
+        # From the root state we can jump straight to the next byte that starts a pattern
+        self.first_bytes = re.compile(b"[" + b"".join(re.escape(bytes([byte])) for byte in self.goto[0]) + b"]")
+    
+    # Scan data and return (matches, state). Matches are (offset, pattern index)
+    # with offsets relative to base_offset. The returned state can be passed to
+    # the next call to continue a match across buffer boundaries.
+    def scan(self, data, state=0, base_offset=0):
+        matches = []
+        if not self.patterns:
+            return matches, 0
+        
+        if self.automaton is not None:
+            text = bytes(data).decode("latin-1")
+            for end, index in self.automaton.iter(text):
+                matches.append((base_offset + end - self.lengths[index] + 1, index))
+            return matches, 0
+        
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        position = 0
+        length = len(data)
+        while position < length:
+            if state == 0:
+                found = self.first_bytes.search(data, position)
+                if found is None:
+                    break
+                position = found.start()
+            byte = data[position]
+            while state and byte not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(byte, 0)
+            if output[state]:
+                for index in output[state]:
+                    matches.append((base_offset + position - self.lengths[index] + 1, index))
+            position += 1
+        return matches, state
+    
+    def find_all(self, data):
+        return self.scan(data)[0]
+    
+    def stream(self):
+        return PatternStream(self)
+
+# Incremental scan over a sequence of chunks. Only the first offset of every
+# pattern is kept so memory stays constant however large the input is.
+class PatternStream:
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.state = 0
+        self.offset = 0
+        self.tail = b""
+        self.first_offsets = {}
+    
+    def feed(self, chunk):
+        matcher = self.matcher
+        if matcher.automaton is None:
+            # The automaton state carries partial matches into the next chunk
+            found, self.state = matcher.scan(chunk, self.state, self.offset)
+        else:
+            # The C automaton cannot resume, so rescan the last max_length - 1
+            # bytes and skip matches that ended inside them
+            tail = self.tail
+            window = tail + bytes(chunk)
+            base = self.offset - len(tail)
+            found = [(base + offset, index) for offset, index in matcher.scan(window)[0]
+                     if offset + matcher.lengths[index] > len(tail)]
+            overlap = matcher.max_length - 1
+            self.tail = window[-overlap:] if overlap else b""
+        
+        for offset, index in found:
+            if index not in self.first_offsets:
+                self.first_offsets[index] = offset
+        self.offset += len(chunk)
+    
+    # (offset, pattern index) of every pattern seen so far, in file order
+    def matches(self):
+        return sorted((offset, index) for index, offset in self.first_offsets.items())
+
+def save_heuristic_rules(rules, rules_path=HEURISTIC_RULES_FILE):
+    with open(rules_path, 'w') as f:
+        json.dump({"version": HEURISTIC_RULES_VERSION, "rules": rules}, f, indent=4)
+
+# Bring a rule file from an older version up to date. Default rules the user
+# has not edited are replaced by their current definition and new defaults
+# are added; rules the user added or changed are kept as they are. Version 1
+# files are a bare list of rules.
+def upgrade_heuristic_rules(rules_path=HEURISTIC_RULES_FILE):
+    try:
+        with open(rules_path, 'r') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            if data.get("version", 0) >= HEURISTIC_RULES_VERSION:
+                return
+            rules = data.get("rules", [])
+        else:
+            rules = data
+        
+        defaults = {rule["name"]: rule for rule in DEFAULT_HEURISTIC_RULES}
+        merged = []
+        for rule in rules:
+            default = defaults.pop(rule.get("name"), None)
+            if (default is not None and "weight" not in rule and "hex" not in rule and
+                    rule.get("pattern") == default["pattern"] and rule.get("category") == default["category"]):
+                merged.append(default)
+            else:
+                merged.append(rule)
+        merged += [rule for rule in DEFAULT_HEURISTIC_RULES if rule["name"] in defaults]
+        save_heuristic_rules(merged, rules_path)
+        log_activity(f"Heuristic rules upgraded to version {HEURISTIC_RULES_VERSION}, {len(defaults)} rules added")
+    except Exception as e:
+        log_activity(f"Error upgrading heuristic rules: {str(e)}", "ERROR")
+
+# Read the heuristic rules; each rule has a name, a text "pattern" or a "hex"
+# byte string, a category and optionally a weight (default by category)
+def load_heuristic_rules(rules_path=HEURISTIC_RULES_FILE):
+    try:
+        with open(rules_path, 'r') as f:
+            rules = json.load(f)
+        if isinstance(rules, dict):
+            rules = rules.get("rules", [])
+    except Exception as e:
+        log_activity(f"Error loading heuristic rules: {str(e)}", "ERROR")
+        rules = DEFAULT_HEURISTIC_RULES
+    
+    loaded = []
+    for rule in rules:
+        try:
+            if "hex" in rule:
+                pattern = bytes.fromhex(rule["hex"])
+            else:
+                pattern = rule["pattern"].encode("utf-8")
+            if not pattern:
+                continue
+            category = rule.get("category", "")
+            loaded.append({
+                "name": rule.get("name", rule.get("pattern", rule.get("hex"))),
+                "pattern": pattern,
+                "category": category,
+                "weight": int(rule.get("weight", HEURISTIC_CATEGORY_WEIGHTS.get(category, 25)))
+            })
+        except Exception as e:
+            log_activity(f"Skipping invalid heuristic rule {rule}: {str(e)}", "ERROR")
+    return loaded
+
+# Compiled rules, rebuilt when the rule file changes. file_types caches
+# whether any rule applies to a file type.
+heuristic_rules_cache = {"mtime": None, "rules": [], "matcher": None, "file_types": {}}
+heuristic_rules_lock = threading.Lock()
+
+# Return (rules, matcher) for the current heuristic rule file
+def get_heuristic_rules():
+    try:
+        mtime = os.stat(HEURISTIC_RULES_FILE).st_mtime_ns
+    except OSError:
+        mtime = 0
+    
+    with heuristic_rules_lock:
+        if heuristic_rules_cache["matcher"] is None or heuristic_rules_cache["mtime"] != mtime:
+            rules = load_heuristic_rules()
+            heuristic_rules_cache["rules"] = rules
+            heuristic_rules_cache["matcher"] = PatternMatcher([rule["pattern"] for rule in rules])
+            heuristic_rules_cache["mtime"] = mtime
+            heuristic_rules_cache["file_types"] = {}
+        return heuristic_rules_cache["rules"], heuristic_rules_cache["matcher"]
+
+# Whether any heuristic rule can score on a file type, so files no rule
+# applies to are hashed without running the pattern automaton
+def heuristic_rules_apply(file_type):
+    with heuristic_rules_lock:
+        applies = heuristic_rules_cache["file_types"]
+        if file_type not in applies:
+            applies[file_type] = any(rule_applies(rule, file_type) for rule in heuristic_rules_cache["rules"])
+        return applies[file_type]
+
+# Classify a file from its first bytes: pe, elf, macho, java, ole, ooxml,
+# jar, zip, archive, pdf, media, script, text, empty or unknown
+def sniff_file_type(header, file_path=""):
+    header = bytes(header[:FILE_TYPE_HEADER_SIZE])
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    if not header:
+        return "empty"
+    
+    if header.startswith(b"MZ"):
+        return "pe"
+    if header.startswith(b"\x7fELF"):
+        return "elf"
+    if header[:4] in (b"\xfe\xed\xfa\xce", b"\xfe\xed\xfa\xcf", b"\xce\xfa\xed\xfe", b"\xcf\xfa\xed\xfe"):
+        return "macho"
+    if header.startswith(b"\xca\xfe\xba\xbe") and len(header) >= 8:
+        # Fat Mach-O binaries and Java classes share a magic; fat
+        # binaries store a small architecture count after it
+        return "macho" if struct.unpack(">I", header[4:8])[0] < 20 else "java"
+    if header.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return "ole"
+    if header.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        if b"[Content_Types].xml" in header:
+            return "ooxml"
+        if b"META-INF/" in header:
+            return "jar"
+        return "zip"
+    if header.startswith((b"\x1f\x8b", b"7z\xbc\xaf\x27\x1c", b"Rar!\x1a\x07", b"BZh", b"\xfd7zXZ\x00", b"!<arch>\n")):
+        return "archive"
+    if b"%PDF-" in header:
+        return "pdf"
+    
+    media = (header.startswith(tuple(MEDIA_SIGNATURES)) or
+             (header.startswith(b"RIFF") and header[8:12] in (b"WAVE", b"AVI ", b"WEBP")) or
+             (header.startswith(b"FORM") and header[8:12] in (b"AIFF", b"AIFC")) or
+             (header.startswith(b"\x00\x00\x01\x00") and ext == ".ico") or
+             header[4:8] == b"ftyp")
+    if media:
+        # A media header on a file that would be run or interpreted is a
+        # polyglot trick, so such files keep the full analysis
+        if ext in SCRIPT_EXTENSIONS or ext in EXECUTABLE_EXTENSIONS:
+            return "unknown"
+        return "media"
+    
+    if header.startswith(b"#!"):
+        return "script"
+    if b"\x00" not in header:
+        text = header.lstrip(b"\xef\xbb\xbf")
+        printable = sum(1 for byte in text if byte >= 32 or byte in (9, 10, 13))
+        if printable >= len(text) * 0.95:
+            return "script" if ext in SCRIPT_EXTENSIONS else "text"
+    if header.startswith((b"\xff\xfe", b"\xfe\xff")) and ext in SCRIPT_EXTENSIONS:
+        # UTF-16 scripts, as written by PowerShell
+        return "script"
+    return "unknown"
+
+# Packed/encrypted content detection
+ENTROPY_BLOCK_SIZE = 64 * 1024
+ENTROPY_SAMPLE_STRIDE = 8  # Histogram every 8th byte of a full block
+ENTROPY_MAX_BLOCKS = 256  # Blocks sampled from large files, bounds the cost per file
+ENTROPY_MIN_SIZE = 4096
+ENTROPY_THRESHOLD = 7.2  # Bits per byte
+ENTROPY_HIGH_RATIO = 0.5  # Share of high entropy blocks that flags a file
+ENTROPY_FILE_TYPES = ["pe", "elf", "macho", "unknown"]
+
+# Byte histograms of evenly spaced blocks; very large files are sampled
+def entropy_histograms(data, size):
+    if size < ENTROPY_BLOCK_SIZE:
+        return np.zeros(1, dtype=np.int64), np.bincount(data, minlength=256)[None, :]
+    
+    block_count = size // ENTROPY_BLOCK_SIZE
+    blocks = np.unique(np.linspace(0, block_count - 1, min(block_count, ENTROPY_MAX_BLOCKS)).astype(np.int64))
+    offsets = blocks * ENTROPY_BLOCK_SIZE
+    histograms = np.empty((len(blocks), 256), dtype=np.int64)
+    for row, offset in enumerate(offsets):
+        histograms[row] = np.bincount(data[offset:offset + ENTROPY_BLOCK_SIZE:ENTROPY_SAMPLE_STRIDE], minlength=256)
+    return offsets, histograms
+
+# Shannon entropy of blocks of the memory-mapped file.
+# Returns (block offsets, entropies) or None if the file is too small.
+def measure_entropy(file_path):
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < ENTROPY_MIN_SIZE:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            try:
+                offsets, histograms = entropy_histograms(data, size)
+            finally:
+                # The mapping cannot close while an array still points into it
+                del data
+    
+    probabilities = histograms / histograms.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(probabilities > 0, probabilities * np.log2(probabilities), 0.0)
+    return offsets, -terms.sum(axis=1)
+
+# Return (offset, description) if most sampled blocks look packed or encrypted
+def entropy_match(file_path):
+    measured = measure_entropy(file_path)
+    if measured is None:
+        return None
+    offsets, entropies = measured
+    high = entropies >= ENTROPY_THRESHOLD
+    if high.mean() < ENTROPY_HIGH_RATIO:
+        return None
+    return int(offsets[high.argmax()]), f"High entropy content ({float(entropies.max()):.2f} bits/byte)"
+
+# PE structure analysis limits
+PE_PARSE_TIMEOUT = 2.0  # Seconds, import parsing is given up on once exceeded
+
+# Imports that are harmless alone but suspicious together. Names are
+# compared without the A/W (ANSI/wide) suffix.
+SUSPICIOUS_IMPORT_COMBINATIONS = [
+    {"name": "Process injection", "imports": ["VirtualAllocEx", "WriteProcessMemory", "CreateRemoteThread"]},
+    {"name": "Process hollowing", "imports": ["CreateProcess", "WriteProcessMemory", "SetThreadContext", "ResumeThread"]},
+    {"name": "APC injection", "imports": ["OpenThread", "VirtualAllocEx", "QueueUserAPC"]},
+    {"name": "Keylogger", "imports": ["SetWindowsHookEx", "GetAsyncKeyState"]},
+    {"name": "Download and execute", "imports": ["URLDownloadToFile", "WinExec"]},
+    {"name": "Download and execute", "imports": ["URLDownloadToFile", "ShellExecute"]}
+]
+
+def normalize_import_name(name):
+    if len(name) > 2 and name[-1] in "AW" and name[-2].islower():
+        return name[:-1]
+    return name
+
+# Parse the headers, sections and import table of a PE file with pefile's
+# fast_load, leaving every other data directory unparsed. pefile maps the
+# whole file, so import tables near the end of large binaries are found.
+# Returns a dict with the import hash, imported names, suspicious import
+# combinations and section findings, or None if the file could not be
+# parsed. complete is only set once the import table was parsed in time.
+def analyze_pe(file_path):
+    started = time.time()
+    try:
+        pe = pefile.PE(name=file_path, fast_load=True)
+    except Exception:
+        return None
+    
+    result = {"imphash": "", "imports": [], "suspicious_imports": [], "writable_code_sections": [], "complete": False}
+    try:
+        for section in pe.sections:
+            characteristics = section.Characteristics
+            if characteristics & 0x20000000 and characteristics & 0x80000000:  # MEM_EXECUTE and MEM_WRITE
+                result["writable_code_sections"].append(section.Name.rstrip(b"\x00").decode("latin-1"))
+    except Exception as e:
+        log_activity(f"Error parsing PE sections of {file_path}: {str(e)}", "ERROR")
+        pe.close()
+        return result
+    
+    # pefile cannot be interrupted, so the import table is parsed on a worker
+    # thread. Past the time limit the result is left incomplete and the
+    # worker closes the file once it finishes.
+    parsed = {}
+    
+    def parse_imports():
+        try:
+            pe.parse_data_directories(directories=[pefile.DIRECTORY_ENTRY["IMAGE_DIRECTORY_ENTRY_IMPORT"]])
+            imports = set()
+            for entry in getattr(pe, "DIRECTORY_ENTRY_IMPORT", []):
+                for symbol in entry.imports:
+                    if symbol.name:
+                        imports.add(normalize_import_name(symbol.name.decode("latin-1")))
+            parsed["imports"] = imports
+            parsed["imphash"] = pe.get_imphash()
+        except Exception as e:
+            parsed["error"] = e
+        finally:
+            pe.close()
+    
+    worker = threading.Thread(target=parse_imports, daemon=True)
+    worker.start()
+    worker.join(max(0.0, PE_PARSE_TIMEOUT - (time.time() - started)))
+    if worker.is_alive():
+        log_activity(f"PE import parsing of {file_path} took longer than {PE_PARSE_TIMEOUT}s, skipped", "WARNING")
+        return result
+    if "error" in parsed:
+        log_activity(f"Error parsing PE imports of {file_path}: {str(parsed['error'])}", "ERROR")
+        return result
+    
+    imports = parsed["imports"]
+    result["imports"] = sorted(imports)
+    result["imphash"] = parsed["imphash"]
+    for combination in SUSPICIOUS_IMPORT_COMBINATIONS:
+        if all(name in imports for name in combination["imports"]):
+            result["suspicious_imports"].append(combination["name"])
+    result["complete"] = True
+    return result
+
+# Heuristic scoring. A file is flagged once the weighted score of its
+# findings reaches HEURISTIC_THRESHOLD.
+HEURISTIC_THRESHOLD = 100
+# Commands only match in scripts and flag one on their own, as they always
+# have. API names and script markers need corroboration.
+HEURISTIC_CATEGORY_WEIGHTS = {"api": 35, "command": 100, "script": 50}
+# File types each rule category is matched in. API names only mean something
+# in binaries and commands only in scripts; other categories match everywhere.
+HEURISTIC_CATEGORY_FILE_TYPES = {"api": ["pe", "unknown"], "command": ["script"], "script": ["script"]}
+
+# Check timings and files matched per pattern rule. The engine keeps one for
+# the whole process and every scan keeps its own, so a scan's history entry
+# only counts the files that scan analyzed.
+class HeuristicStatistics:
+    def __init__(self, check_names=()):
+        self.stats = {name: {"runs": 0, "hits": 0, "seconds": 0.0} for name in check_names}
+        self.rule_hits = {}
+        self.lock = threading.Lock()
+    
+    def add_check(self, name):
+        with self.lock:
+            self.stats.setdefault(name, {"runs": 0, "hits": 0, "seconds": 0.0})
+    
+    # Timings and rule hits are recorded by the caller so checks that ran in a
+    # worker process still end up in the statistics of the main process
+    def record(self, timings, rule_hits=()):
+        with self.lock:
+            for name, hit, seconds in timings:
+                stats = self.stats.setdefault(name, {"runs": 0, "hits": 0, "seconds": 0.0})
+                stats["runs"] += 1
+                stats["hits"] += 1 if hit else 0
+                stats["seconds"] += seconds
+            for name in rule_hits:
+                self.rule_hits[name] = self.rule_hits.get(name, 0) + 1
+    
+    # Files matched per pattern rule, including rules that never matched,
+    # so rules that never fire can be pruned
+    def rule_statistics(self):
+        rules, _ = get_heuristic_rules()
+        with self.lock:
+            hits = {rule["name"]: 0 for rule in rules}
+            hits.update(self.rule_hits)
+            return hits
+    
+    def statistics(self):
+        with self.lock:
+            return {
+                name: {
+                    "runs": stats["runs"],
+                    "hits": stats["hits"],
+                    "seconds": round(stats["seconds"], 3),
+                    "avg_ms": round(stats["seconds"] * 1000 / stats["runs"], 3) if stats["runs"] else 0.0
+                }
+                for name, stats in self.stats.items()
+            }
+
+# Weighted checks run cheapest first. Evaluation stops as soon as the score
+# reaches the threshold or the checks left can no longer bring it there.
+class HeuristicEngine:
+    def __init__(self, threshold=HEURISTIC_THRESHOLD):
+        self.threshold = threshold
+        self.checks = []
+        # Statistics of every file analyzed in this process
+        self.totals = HeuristicStatistics()
+    
+    # function(context) returns a list of (offset, description, score);
+    # a check never adds more than its weight to the total. A supporting
+    # check only runs once some other check has found something, so it
+    # can never flag a file on its own.
+    def add_check(self, name, weight, cost, function, file_types=None, supporting=False):
+        self.checks.append({"name": name, "weight": weight, "cost": cost,
+                            "function": function, "file_types": file_types, "supporting": supporting})
+        self.checks.sort(key=lambda check: check["cost"])
+        self.totals.add_check(name)
+    
+    # Empty statistics for one scan, listing every check
+    def new_statistics(self):
+        return HeuristicStatistics([check["name"] for check in self.checks])
+    
+    def evaluate(self, context):
+        checks = [check for check in self.checks
+                  if check["file_types"] is None or context["file_type"] in check["file_types"]]
+        # Supporting checks run last, and only once the others found something
+        checks = [check for check in checks if not check["supporting"]] + \
+                 [check for check in checks if check["supporting"]]
+        remaining = sum(check["weight"] for check in checks)
+        score = 0
+        supporting_score = 0
+        findings = []
+        timings = []
+        for check in checks:
+            if check["supporting"] and not score:
+                break
+            if score + supporting_score >= self.threshold or score + supporting_score + remaining < self.threshold:
+                break
+            remaining -= check["weight"]
+            
+            started = time.perf_counter()
+            try:
+                found = check["function"](context)
+            except Exception as e:
+                log_activity(f"Heuristic check {check['name']} failed on {context['file_path']}: {str(e)}", "ERROR")
+                found = []
+            # Work done while streaming the file is charged to the check that uses it
+            seconds = time.perf_counter() - started + context["prepaid_seconds"].get(check["name"], 0.0)
+            
+            points = min(sum(points for _, _, points in found), check["weight"])
+            if check["supporting"]:
+                supporting_score += points
+            else:
+                score += points
+            findings += [(offset, description) for offset, description, _ in found]
+            timings.append((check["name"], len(found) > 0, seconds))
+        
+        if score:
+            score += supporting_score
+        return {"score": score, "detected": score >= self.threshold, "findings": findings, "timings": timings}
+    
+    def record(self, timings, rule_hits=()):
+        self.totals.record(timings, rule_hits)
+    
+    def rule_statistics(self):
+        return self.totals.rule_statistics()
+    
+    def statistics(self):
+        return self.totals.statistics()
+
+def rule_applies(rule, file_type):
+    return file_type in HEURISTIC_CATEGORY_FILE_TYPES.get(rule["category"], [file_type])
+
+def pattern_findings(context, keep):
+    return [(offset, rule["name"], rule["weight"]) for offset, rule in context["pattern_matches"]
+            if keep(rule["category"]) and rule_applies(rule, context["file_type"])]
+
+def check_patterns(context):
+    excluded = ["script"]
+    if context["file_type"] == "pe" and pefile is not None:
+        # API names in PE files are judged by the import table instead
+        excluded.append("api")
+    return pattern_findings(context, lambda category: category not in excluded)
+
+def check_script_markers(context):
+    return pattern_findings(context, lambda category: category == "script")
+
+def check_entropy(context):
+    packed = entropy_match(context["file_path"])
+    if packed is None:
+        return []
+    return [(packed[0], packed[1], 60)]
+
+def check_pe_imports(context):
+    pe_info = analyze_pe(context["file_path"])
+    context["pe_info"] = pe_info
+    if pe_info is None or not pe_info["complete"]:
+        # Without an import table fall back to the API name strings
+        found = pattern_findings(context, lambda category: category == "api")
+    else:
+        found = [(0, f"Suspicious imports: {name}", 100) for name in pe_info["suspicious_imports"]]
+    if pe_info is not None and pe_info["writable_code_sections"]:
+        found.append((0, f"Writable code section: {', '.join(pe_info['writable_code_sections'])}", 30))
+    return found
+
+heuristic_engine = HeuristicEngine()
+heuristic_engine.add_check("patterns", HEURISTIC_THRESHOLD, 1, check_patterns)
+heuristic_engine.add_check("script_markers", HEURISTIC_THRESHOLD, 1, check_script_markers)
+if np is not None:
+    # Compressed formats are high entropy by design, only binaries are checked.
+    # Packed installers and compressed resources are common, so entropy only
+    # adds to other evidence.
+    heuristic_engine.add_check("entropy", 60, 10, check_entropy, ENTROPY_FILE_TYPES, supporting=True)
+if pefile is not None:
+    heuristic_engine.add_check("pe_imports", 130, 20, check_pe_imports, ["pe"])
+
+# Hash a file and run the heuristic patterns over the same chunk stream.
+# The file type is sniffed from the first chunk and decides which analyzers
+# run. Returns the hashes, the heuristic result (score, detected, findings
+# as (offset, description) and check timings), the file type and the PE
+# analysis (None if it did not run).
+# Kept at module level so it can also run inside a worker process.
+def analyze_file_contents(file_path):
+    rules, matcher = get_heuristic_rules()
+    # The heuristics see the same chunks as the hashes, so files of any
+    # size are covered without being loaded into memory
+    stream = matcher.stream()
+    state = {"file_type": None, "stream": False, "seconds": 0.0}
+    
+    def on_chunk(chunk):
+        if state["file_type"] is None:
+            state["file_type"] = sniff_file_type(chunk, file_path)
+            state["stream"] = state["file_type"] not in HASH_ONLY_FILE_TYPES and bool(matcher.patterns) \
+                and heuristic_rules_apply(state["file_type"])
+        if state["stream"]:
+            started = time.perf_counter()
+            stream.feed(chunk)
+            state["seconds"] += time.perf_counter() - started
+    
+    hashes = hash_file(file_path, on_chunk)
+    file_type = state["file_type"] or "empty"
+    if file_type in HASH_ONLY_FILE_TYPES:
+        return hashes, {"score": 0, "detected": False, "findings": [], "timings": [], "rule_hits": []}, file_type, None
+    
+    context = {
+        "file_path": file_path,
+        "file_type": file_type,
+        "pattern_matches": [(offset, rules[index]) for offset, index in stream.matches()],
+        "prepaid_seconds": {"patterns": state["seconds"]},
+        "pe_info": None
+    }
+    heuristic = heuristic_engine.evaluate(context)
+    # Counted whether or not the check using the rule ran before scoring stopped
+    heuristic["rule_hits"] = sorted({rule["name"] for _, rule in context["pattern_matches"]
+                                     if rule_applies(rule, file_type)})
+    return hashes, heuristic, file_type, context["pe_info"]
+
+# Compiled YARA rules. Every rule file in YARA_RULES_FOLDER is compiled on
+# its own and cached, so editing one file only recompiles that file and a
+# rule set that keeps timing out can be switched off without the others.
+class YaraEngine:
+    RULE_EXTENSIONS = (".yar", ".yara")
+    
+    def __init__(self, rules_dir=YARA_RULES_FOLDER, cache_dir=YARA_CACHE_FOLDER):
+        self.rules_dir = rules_dir
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.rule_sets = {}
+        self.version = "0"
+        self.timeout = 10
+        self.max_timeouts = 3
+        self.lock = threading.Lock()
+    
+    def source_fingerprints(self):
+        fingerprints = {}
+        try:
+            for entry in os.scandir(self.rules_dir):
+                if entry.is_file() and entry.name.lower().endswith(self.RULE_EXTENSIONS):
+                    stat = entry.stat()
+                    fingerprints[entry.name] = f"{stat.st_size}-{stat.st_mtime_ns}"
+        except OSError:
+            pass
+        return fingerprints
+    
+    def read_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+    
+    def write_index(self, index):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+    
+    def load_rule_set(self, name, fingerprint, index):
+        compiled_path = os.path.join(self.cache_dir, name + ".yarc")
+        if index.get(name) == fingerprint and os.path.exists(compiled_path):
+            try:
+                return yara.load(compiled_path)
+            except Exception:
+                # Stale or built by another libyara version, compile again
+                pass
+        
+        rules = yara.compile(filepath=os.path.join(self.rules_dir, name))
+        temp_path = compiled_path + ".tmp"
+        rules.save(temp_path)
+        os.replace(temp_path, compiled_path)
+        index[name] = fingerprint
+        log_activity(f"Compiled YARA rules: {name}")
+        return rules
+    
+    # Pick up added, changed and removed rule files
+    def refresh(self, settings=None):
+        if settings is not None:
+            self.timeout = max(1, int(settings.get("yara_timeout", 10)))
+            self.max_timeouts = max(1, int(settings.get("yara_max_timeouts", 3)))
+        if yara is None:
+            return self
+        
+        fingerprints = self.source_fingerprints()
+        with self.lock:
+            if fingerprints == {name: rule_set["fingerprint"] for name, rule_set in self.rule_sets.items()}:
+                return self
+            
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                index = self.read_index()
+                rule_sets = {}
+                for name, fingerprint in sorted(fingerprints.items()):
+                    current = self.rule_sets.get(name)
+                    if current is not None and current["fingerprint"] == fingerprint:
+                        rule_sets[name] = current
+                        continue
+                    
+                    try:
+                        rules = self.load_rule_set(name, fingerprint, index)
+                    except Exception as e:
+                        log_activity(f"Error compiling YARA rules {name}: {str(e)}", "ERROR")
+                        rules = None
+                    rule_sets[name] = {"fingerprint": fingerprint, "rules": rules, "timeouts": 0, "disabled": False}
+                
+                # Forget compiled files whose source was removed
+                for name in list(index):
+                    if name not in fingerprints:
+                        del index[name]
+                        try:
+                            os.remove(os.path.join(self.cache_dir, name + ".yarc"))
+                        except OSError:
+                            pass
+                self.write_index(index)
+            except Exception as e:
+                log_activity(f"Error loading YARA rules: {str(e)}", "ERROR")
+                return self
+            
+            self.rule_sets = rule_sets
+            self.version = hashlib.sha256(json.dumps(fingerprints, sort_keys=True).encode()).hexdigest()[:16]
+        return self
+    
+    def record_timeout(self, name, rule_set):
+        with self.lock:
+            rule_set["timeouts"] += 1
+            log_activity(f"YARA rules {name} timed out ({rule_set['timeouts']}/{self.max_timeouts})", "WARNING")
+            if rule_set["timeouts"] >= self.max_timeouts and not rule_set["disabled"]:
+                rule_set["disabled"] = True
+                log_activity(f"YARA rules {name} disabled after repeated timeouts", "ERROR")
+    
+    # Match every enabled rule set against the memory-mapped file and return
+    # the matching rules as "file:rule" names
+    def match(self, file_path, size):
+        rule_sets = [(name, rule_set) for name, rule_set in self.rule_sets.items()
+                     if rule_set["rules"] is not None and not rule_set["disabled"]]
+        if not rule_sets or size == 0:
+            return []
+        
+        matches = []
+        with open(file_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for name, rule_set in rule_sets:
+                    try:
+                        found = rule_set["rules"].match(data=data, timeout=self.timeout)
+                    except yara.TimeoutError:
+                        self.record_timeout(name, rule_set)
+                        continue
+                    matches.extend(f"{name}:{match.rule}" for match in found)
+        return matches
+
+yara_engine = YaraEngine()
+
+# Version of every rule source a cached verdict depends on, as
+# "signatures:yara:heuristics". Signature updates only change the first part.
+def detection_version(signatures):
+    return f"{signatures.version}:{yara_engine.version}:{heuristic_rules_cache['mtime']}"
+
+# Bring a verdict cached under older signatures up to date from its cached
+# digests, without reading the file. YARA rules and heuristics only run when
+# no signature matched, so a cached signature match that no longer matches
+# needs a full rescan (None).
+def refresh_cached_verdict(cached, signatures):
+    if signatures.match(cached["hashes"]):
+        return "Malware signature match"
+    if cached["verdict"] == "Malware signature match":
+        return None
+    return cached["verdict"]
+
+# Signature database manifest: the current version number, the version of
+# the base database file and the delta packs applied on top of it
+def read_signature_manifest():
     try:
-        with open(MALWARE_SIGNATURES_FILE, 'r') as f:
+        with open(SIGNATURE_MANIFEST_FILE, 'r') as f:
             return json.load(f)
+    except (OSError, ValueError):
+        return {"version": 0, "base_version": 0, "journal": []}
+
+def write_signature_manifest(manifest):
+    temp_path = f"{SIGNATURE_MANIFEST_FILE}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, SIGNATURE_MANIFEST_FILE)
+
+# Base database file the manifest points at. Each base database gets its
+# own file name so a new one never has to replace a file that running
+# scanners still have mapped.
+def get_signature_db_path(manifest):
+    return os.path.join(DATABASE_PATH, manifest.get("base_file", os.path.basename(MALWARE_SIGNATURES_FILE)))
+
+# Digest sizes of the supported signature algorithms
+SIGNATURE_ALGORITHMS = {"md5": 16, "sha1": 20, "sha256": 32}
+
+# Signature database layout: a header, then one section record per
+# algorithm, then per algorithm a prefix jump table and its sorted digests.
+# Entry p of a jump table is the index of the first digest whose leading
+# 16 bits are >= p, so a lookup only binary-searches one small bucket.
+SIGNATURE_DB_MAGIC = b"ASDB"
+SIGNATURE_DB_FORMAT = 1
+SIGNATURE_PREFIX_BITS = 16
+SIGNATURE_DB_HEADER = struct.Struct("<4sHHI")  # magic, format, prefix bits, section count
+SIGNATURE_DB_SECTION = struct.Struct("<8sIQQQ")  # algorithm, digest size, count, table offset, data offset
+SIGNATURE_WRITE_BATCH = 65536  # Digests joined per write
+
+def parse_signature_json(signatures):
+    # Convert hex digest lists to sorted lists of raw digests
+    digests = {}
+    for algorithm, size in SIGNATURE_ALGORITHMS.items():
+        unique = set()
+        for hex_digest in signatures.get(algorithm, []):
+            try:
+                digest = bytes.fromhex(hex_digest)
+            except (TypeError, ValueError):
+                continue
+            if len(digest) == size:
+                unique.add(digest)
+        digests[algorithm] = sorted(unique)
+    return digests
+
+def write_signature_db(digests, db_path):
+    # digests maps each algorithm to its raw digests in sorted order, as a
+    # list or any iterable, so the database is written sequentially without
+    # holding the digests in memory. A section's jump table is filled in once
+    # its digests have been written.
+    buckets = 1 << SIGNATURE_PREFIX_BITS
+    prefix_bytes = SIGNATURE_PREFIX_BITS // 8
+    sections = []
+    
+    temp_path = f"{db_path}.tmp"
+    with open(temp_path, 'w+b') as f:
+        f.seek(SIGNATURE_DB_HEADER.size + SIGNATURE_DB_SECTION.size * len(SIGNATURE_ALGORITHMS))
+        for algorithm, size in SIGNATURE_ALGORITHMS.items():
+            table_offset = f.tell()
+            data_offset = table_offset + (buckets + 1) * 4
+            f.seek(data_offset)
+            prefix_counts = [0] * buckets
+            count = 0
+            batch = []
+            for digest in digests.get(algorithm, []):
+                prefix_counts[int.from_bytes(digest[:prefix_bytes], "big")] += 1
+                batch.append(digest)
+                if len(batch) >= SIGNATURE_WRITE_BATCH:
+                    f.write(b"".join(batch))
+                    count += len(batch)
+                    batch = []
+            f.write(b"".join(batch))
+            count += len(batch)
+            end = f.tell()
+            
+            table = [0]
+            for prefix_count in prefix_counts:
+                table.append(table[-1] + prefix_count)
+            f.seek(table_offset)
+            f.write(struct.pack(f"<{buckets + 1}I", *table))
+            f.seek(end)
+            sections.append((algorithm, size, count, table_offset, data_offset))
+        
+        f.seek(0)
+        f.write(SIGNATURE_DB_HEADER.pack(SIGNATURE_DB_MAGIC, SIGNATURE_DB_FORMAT,
+                                         SIGNATURE_PREFIX_BITS, len(sections)))
+        for algorithm, size, count, table_offset, data_offset in sections:
+            f.write(SIGNATURE_DB_SECTION.pack(algorithm.encode("ascii"), size, count,
+                                              table_offset, data_offset))
+    os.replace(temp_path, db_path)
+
+SIGNATURE_BASE_PATTERN = re.compile(r"^signatures(\.v\d+\.\d+)?\.db$")
+
+def signature_base_name(version):
+    return f"signatures.v{version}.{time.time_ns()}.db"
+
+def install_signature_base(digests, version, base_file=None):
+    # Write a new base database, keeping the previous base, journal and
+    # manifest so the change can be rolled back. base_file names a database
+    # that was already written from digests.
+    manifest = read_signature_manifest()
+    manifest.pop("previous", None)
+    if base_file is None:
+        base_file = signature_base_name(version)
+        write_signature_db(digests, os.path.join(DATABASE_PATH, base_file))
+    if os.path.exists(SIGNATURE_JOURNAL_FILE):
+        os.replace(SIGNATURE_JOURNAL_FILE, f"{SIGNATURE_JOURNAL_FILE}.bak")
+    write_signature_manifest({
+        "version": version,
+        "base_version": version,
+        "base_file": base_file,
+        "journal": [],
+        "previous": manifest
+    })
+    
+    # Remove base files that are neither current nor kept for rollback.
+    # Files still mapped by a scanner are retried on the next install.
+    keep = {base_file, os.path.basename(get_signature_db_path(manifest))}
+    for filename in os.listdir(DATABASE_PATH):
+        if SIGNATURE_BASE_PATTERN.match(filename) and filename not in keep:
+            try:
+                os.remove(os.path.join(DATABASE_PATH, filename))
+            except OSError:
+                pass
+
+def convert_signatures(json_path=SIGNATURES_JSON_FILE, db_path=None):
+    # Build the memory-mapped signature database from a JSON signatures file.
+    # Without db_path the result is installed as a new database version.
+    # An explicit db_path is export-only: the scanner always loads the base
+    # file named in the manifest, so the written file is never used by the
+    # app until it is installed.
+    with open(json_path, 'r') as f:
+        digests = parse_signature_json(json.load(f))
+    if db_path is None:
+        with signature_handle.lock:
+            install_signature_base(digests, read_signature_manifest()["version"] + 1)
+            db_path = get_signature_db_path(read_signature_manifest())
+    else:
+        write_signature_db(digests, db_path)
+    total = sum(len(values) for values in digests.values())
+    log_activity(f"Converted {total} signatures from {json_path} to {db_path}")
+    return total
+
+# Sorted digests of one algorithm inside the mapped signature database
+class SignatureTable:
+    def __init__(self, data, size, count, table_offset, data_offset):
+        self.data = data
+        self.size = size
+        self.count = count
+        self.table_offset = table_offset
+        self.data_offset = data_offset
+    
+    def __contains__(self, digest):
+        if len(digest) != self.size or not self.count:
+            return False
+        prefix = int.from_bytes(digest[:SIGNATURE_PREFIX_BITS // 8], "big")
+        low, high = struct.unpack_from("<II", self.data, self.table_offset + prefix * 4)
+        while low < high:
+            middle = (low + high) // 2
+            start = self.data_offset + middle * self.size
+            probe = self.data[start:start + self.size]
+            if probe < digest:
+                low = middle + 1
+            elif probe > digest:
+                high = middle
+            else:
+                return True
+        return False
+    
+    def __iter__(self):
+        for index in range(self.count):
+            start = self.data_offset + index * self.size
+            yield self.data[start:start + self.size]
+    
+    def __len__(self):
+        return self.count
+
+# Bloom filter over raw digests, consulted before the exact lookup so that
+# the common case (a clean file) never touches the mapped database
+class BloomFilter:
+    MAGIC = b"ABL2"  # ABLM filters used unbounded positions and are rebuilt
+    MASK64 = (1 << 64) - 1
+    BUILD_BATCH = 1 << 20  # Digests per vectorised build step
+    HEADER = struct.Struct("<4sQIH")  # magic, bit count, hash count, DB version length
+    
+    def __init__(self, bit_count, hash_count, bits=None):
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.bits = bits if bits is not None else bytearray((bit_count + 7) // 8)
+    
+    @staticmethod
+    def parameters(capacity, false_positive_rate, max_bytes):
+        # Optimal size for the requested false-positive rate, capped by the memory budget
+        capacity = max(1, capacity)
+        false_positive_rate = min(max(false_positive_rate, 1e-9), 0.5)
+        bit_count = int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2))
+        bit_count = max(64, min(bit_count, max(1, max_bytes) * 8))
+        hash_count = max(1, min(16, round(bit_count / capacity * math.log(2))))
+        return bit_count, hash_count
+    
+    def positions(self, digest):
+        # Digests are already uniformly distributed, so two slices of the
+        # digest drive double hashing without hashing it again. Positions
+        # wrap at 64 bits so add_digests() computes the same ones in numpy.
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        for index in range(self.hash_count):
+            yield ((first + index * second) & self.MASK64) % self.bit_count
+    
+    def add(self, digest):
+        for position in self.positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    # Add an (n, digest size) uint8 array of digests in one vectorised pass
+    def add_digests(self, digests):
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        bit_count = np.uint64(self.bit_count)
+        for start in range(0, len(digests), self.BUILD_BATCH):
+            batch = digests[start:start + self.BUILD_BATCH]
+            first = np.ascontiguousarray(batch[:, :8]).view("<u8").ravel()
+            second = np.ascontiguousarray(batch[:, 8:16]).view("<u8").ravel() | np.uint64(1)
+            for index in range(self.hash_count):
+                positions = (first + np.uint64(index) * second) % bit_count
+                np.bitwise_or.at(bits, (positions >> np.uint64(3)).astype(np.intp),
+                                 (np.uint64(1) << (positions & np.uint64(7))).astype(np.uint8))
+        del bits
+    
+    def __contains__(self, digest):
+        for position in self.positions(digest):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+    
+    def save(self, path, version):
+        version = version.encode("utf-8")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.bit_count, self.hash_count, len(version)))
+            f.write(version)
+            f.write(self.bits)
+        os.replace(temp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        # Returns the filter and the database version it was built from
+        with open(path, 'rb') as f:
+            magic, bit_count, hash_count, version_length = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            if magic != cls.MAGIC:
+                raise ValueError(f"Not a current bloom filter file: {path}")
+            version = f.read(version_length).decode("utf-8")
+            bits = bytearray(f.read())
+        if len(bits) != (bit_count + 7) // 8:
+            raise ValueError(f"Truncated bloom filter file: {path}")
+        return cls(bit_count, hash_count, bits), version
+
+def load_signature_bloom(store, bloom_path=SIGNATURE_BLOOM_FILE):
+    # Load the persisted filter, rebuilding it if the signatures or the
+    # configured false-positive rate / memory budget changed
+    current_settings = load_settings()
+    bit_count, hash_count = BloomFilter.parameters(
+        len(store),
+        float(current_settings.get("bloom_false_positive_rate", 0.001)),
+        int(float(current_settings.get("bloom_max_mb", 64)) * 1024 * 1024)
+    )
+    
+    if os.path.exists(bloom_path):
+        try:
+            bloom, version = BloomFilter.load(bloom_path)
+            if (version == store.fingerprint and bloom.bit_count == bit_count and
+                    bloom.hash_count == hash_count):
+                return bloom
+        except Exception as e:
+            log_activity(f"Error loading signature bloom filter: {str(e)}", "ERROR")
+    
+    started = time.time()
+    bloom = BloomFilter(bit_count, hash_count)
+    for table in store.tables.values():
+        if not table.count:
+            continue
+        if np is not None:
+            digests = np.frombuffer(store.data, dtype=np.uint8, count=table.count * table.size,
+                                    offset=table.data_offset).reshape(table.count, table.size)
+            bloom.add_digests(digests)
+            # Release the view so the mapping can be closed later
+            del digests
+        else:
+            for digest in table:
+                bloom.add(digest)
+    try:
+        bloom.save(bloom_path, store.fingerprint)
     except Exception as e:
-        log_activity(f"Error loading signatures: {str(e)}", "ERROR")
-        return {"md5": [], "sha1": [], "sha256": []}
+        log_activity(f"Error saving signature bloom filter: {str(e)}", "ERROR")
+    log_activity(f"Built signature bloom filter ({bit_count // 8} bytes, {hash_count} hashes) "
+                 f"in {time.time() - started:.2f}s")
+    return bloom
+
+# Read-only signature database backed by a memory-mapped file. All threads
+# and worker processes share the same page cache, and opening it does not
+# parse the digests. Delta packs are kept as small in-memory overlays of
+# added and removed digests on top of the mapped base.
+class SignatureStore:
+    def __init__(self, db_path):
+        self.path = db_path
+        with open(db_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.fingerprint = f"{stat.st_size}-{stat.st_mtime_ns}"
+            self.version = self.fingerprint
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, db_format, prefix_bits, section_count = SIGNATURE_DB_HEADER.unpack_from(self.data, 0)
+        if magic != SIGNATURE_DB_MAGIC or db_format != SIGNATURE_DB_FORMAT or prefix_bits != SIGNATURE_PREFIX_BITS:
+            self.data.close()
+            raise ValueError(f"Unsupported signature database: {db_path}")
+        
+        self.tables = {}
+        for index in range(section_count):
+            name, size, count, table_offset, data_offset = SIGNATURE_DB_SECTION.unpack_from(
+                self.data, SIGNATURE_DB_HEADER.size + index * SIGNATURE_DB_SECTION.size)
+            algorithm = name.rstrip(b"\0").decode("ascii")
+            self.tables[algorithm] = SignatureTable(self.data, size, count, table_offset, data_offset)
+        self.bloom = None
+        self.added = {algorithm: set() for algorithm in SIGNATURE_ALGORITHMS}
+        self.removed = {algorithm: set() for algorithm in SIGNATURE_ALGORITHMS}
+    
+    def derive(self, keep_overlay=True):
+        # New store sharing the mapped base and bloom filter with this one;
+        # only the (small) overlay sets are copied
+        store = copy.copy(self)
+        store.added = {algorithm: set(digests) if keep_overlay else set() for algorithm, digests in self.added.items()}
+        store.removed = {algorithm: set(digests) if keep_overlay else set() for algorithm, digests in self.removed.items()}
+        return store
+    
+    def with_delta(self, delta):
+        store = self.derive()
+        store.apply_delta(delta)
+        return store
+    
+    def apply_delta(self, delta):
+        # Only used on stores that are not yet published.
+        # Overlays only hold digests that actually change the base set
+        added = parse_signature_json(delta.get("add", {}))
+        removed = parse_signature_json(delta.get("remove", {}))
+        for algorithm, table in self.tables.items():
+            for digest in added.get(algorithm, []):
+                if digest in self.removed[algorithm]:
+                    self.removed[algorithm].discard(digest)
+                elif digest not in table:
+                    self.added[algorithm].add(digest)
+            for digest in removed.get(algorithm, []):
+                if digest in self.added[algorithm]:
+                    self.added[algorithm].discard(digest)
+                elif digest in table:
+                    self.removed[algorithm].add(digest)
+        self.version = str(delta["version"])
+    
+    def iter_digests(self, algorithm):
+        # Current digest set in sorted order: the mapped base without removed
+        # entries, merged with the additions. Only the overlays are held in memory.
+        removed = self.removed[algorithm]
+        base = (digest for digest in self.tables[algorithm] if digest not in removed)
+        return heapq.merge(base, sorted(self.added[algorithm]))
+    
+    def contains(self, algorithm, hex_digest):
+        try:
+            digest = bytes.fromhex(hex_digest)
+            if digest in self.removed[algorithm]:
+                return False
+            if digest in self.added[algorithm]:
+                return True
+            # The bloom filter only covers the base database
+            if self.bloom is not None and digest not in self.bloom:
+                return False
+            return digest in self.tables[algorithm]
+        except (KeyError, ValueError):
+            return False
+    
+    def match(self, hashes):
+        # Return the first algorithm whose digest is a known signature
+        for algorithm in SIGNATURE_ALGORITHMS:
+            if algorithm in hashes and self.contains(algorithm, hashes[algorithm]):
+                return algorithm
+        return None
+    
+    def __len__(self):
+        return sum(len(table) + len(self.added[algorithm]) - len(self.removed[algorithm])
+                   for algorithm, table in self.tables.items())
+
+# Fold the delta journal into a new base database once it grows past this size
+SIGNATURE_JOURNAL_MAX_BYTES = 32 * 1024 * 1024
+
+def signature_delta_checksum(delta):
+    payload = {key: delta.get(key) for key in ("base_version", "version", "add", "remove")}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def create_signature_delta(base_version, add=None, remove=None):
+    # add/remove use the signatures.json layout: {"sha256": [...], ...}
+    delta = {"base_version": base_version, "version": base_version + 1, "add": add or {}, "remove": remove or {}}
+    delta["sha256"] = signature_delta_checksum(delta)
+    return delta
+
+def read_signature_journal(manifest):
+    # Load the delta packs recorded in the manifest, verifying each one
+    deltas = []
+    if not manifest.get("journal"):
+        return deltas
+    with open(SIGNATURE_JOURNAL_FILE, 'rb') as f:
+        for record in manifest["journal"]:
+            f.seek(record["offset"])
+            delta = json.loads(f.read(record["length"]))
+            if delta.get("sha256") != record["sha256"] or signature_delta_checksum(delta) != record["sha256"]:
+                raise ValueError(f"Signature delta {record['version']} failed the integrity check")
+            deltas.append(delta)
+    return deltas
+
+def apply_signature_delta(delta):
+    # Append a verified delta pack to the journal instead of rewriting the database
+    with signature_handle.lock:
+        try:
+            manifest = read_signature_manifest()
+            if delta.get("sha256") != signature_delta_checksum(delta):
+                return False, "Signature delta failed the integrity check"
+            if delta.get("base_version") != manifest["version"]:
+                return False, f"Signature delta is for version {delta.get('base_version')}, database is at version {manifest['version']}"
+            if not isinstance(delta.get("version"), int) or delta["version"] <= manifest["version"]:
+                return False, "Signature delta has an invalid version"
+            
+            line = (json.dumps(delta, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+            with open(SIGNATURE_JOURNAL_FILE, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            
+            manifest["journal"].append({
+                "version": delta["version"],
+                "base_version": delta["base_version"],
+                "offset": offset,
+                "length": len(line),
+                "sha256": delta["sha256"]
+            })
+            manifest["version"] = delta["version"]
+            write_signature_manifest(manifest)
+            log_activity(f"Applied signature delta {delta['base_version']} -> {delta['version']}")
+            
+            # Publish a copy-on-write store to running scanners
+            current = signature_handle.store
+            if current is not None and current.version == str(delta["base_version"]):
+                signature_handle.publish(current.with_delta(delta))
+            
+            if offset + len(line) > SIGNATURE_JOURNAL_MAX_BYTES:
+                start_signature_compaction()
+            return True, f"Signature database updated to version {delta['version']}"
+        except Exception as e:
+            log_activity(f"Error applying signature delta: {str(e)}", "ERROR")
+            return False, str(e)
+
+# Only one compaction runs at a time
+signature_compaction_lock = threading.Lock()
+
+def compact_signatures():
+    # Merge the journal into a new base database at the same version. The
+    # merge and the database write run without the handle lock so scanners
+    # keep refreshing; only switching the manifest over takes it. Returns
+    # False if another compaction is running or the database changed
+    # meanwhile, in which case the next large update compacts again.
+    if not signature_compaction_lock.acquire(blocking=False):
+        return False
+    try:
+        manifest = read_signature_manifest()
+        store = SignatureStore(get_signature_db_path(manifest))
+        for delta in read_signature_journal(manifest):
+            store.apply_delta(delta)
+        # Stream the merged digests straight from the mapped base into the new file
+        base_file = signature_base_name(manifest["version"])
+        try:
+            write_signature_db({algorithm: store.iter_digests(algorithm) for algorithm in SIGNATURE_ALGORITHMS},
+                               os.path.join(DATABASE_PATH, base_file))
+        finally:
+            store.data.close()
+            store = None
+        
+        with signature_handle.lock:
+            if read_signature_manifest() != manifest:
+                os.remove(os.path.join(DATABASE_PATH, base_file))
+                log_activity("Signature compaction skipped, the database changed while it ran")
+                return False
+            install_signature_base(None, manifest["version"], base_file)
+            signature_handle.refresh(force=True)
+        log_activity(f"Compacted signature database at version {manifest['version']}")
+        return True
+    finally:
+        signature_compaction_lock.release()
+
+def start_signature_compaction():
+    def run():
+        try:
+            compact_signatures()
+        except Exception as e:
+            log_activity(f"Error compacting signatures: {str(e)}", "ERROR")
+    threading.Thread(target=run, daemon=True).start()
+
+def rollback_signatures():
+    # Undo the last delta pack, or the last base database replacement
+    with signature_handle.lock:
+        try:
+            manifest = read_signature_manifest()
+            previous = manifest.get("previous")
+            if manifest.get("journal"):
+                record = manifest["journal"].pop()
+                with open(SIGNATURE_JOURNAL_FILE, 'r+b') as f:
+                    f.truncate(record["offset"])
+                manifest["version"] = record["base_version"]
+                write_signature_manifest(manifest)
+            elif previous and os.path.exists(get_signature_db_path(previous)):
+                if os.path.exists(f"{SIGNATURE_JOURNAL_FILE}.bak"):
+                    os.replace(f"{SIGNATURE_JOURNAL_FILE}.bak", SIGNATURE_JOURNAL_FILE)
+                manifest = previous
+                write_signature_manifest(manifest)
+            else:
+                return False, "No previous signature version to roll back to"
+            signature_handle.refresh(force=True)
+            log_activity(f"Signature database rolled back to version {manifest['version']}")
+            return True, f"Signature database rolled back to version {manifest['version']}"
+        except Exception as e:
+            log_activity(f"Error rolling back signatures: {str(e)}", "ERROR")
+            return False, str(e)
+
+# Single shared, versioned handle on the signature database. Scanners read
+# signature_handle.current() for every file instead of keeping their own
+# copy, so an update reaches running scanners as soon as it is published.
+# Published stores are never modified; updates build a new store that
+# shares the mapped base database and swap it in with one assignment.
+class SignatureHandle:
+    def __init__(self):
+        self.store = None
+        self.lock = threading.RLock()
+    
+    def current(self):
+        store = self.store
+        if store is None:
+            store = self.refresh()
+        return store
+    
+    def publish(self, store):
+        self.store = store
+        log_activity(f"Signature database version {store.version} active ({len(store)} signatures)")
+    
+    def refresh(self, force=False):
+        # Pick up changes made on disk (imports, other processes). signatures.json
+        # is imported again whenever it is newer than the database.
+        with self.lock:
+            manifest = read_signature_manifest()
+            db_path = get_signature_db_path(manifest)
+            try:
+                if os.path.exists(SIGNATURES_JSON_FILE) and (
+                        not os.path.exists(db_path) or
+                        os.path.getmtime(SIGNATURES_JSON_FILE) > os.path.getmtime(db_path)):
+                    convert_signatures()
+                    manifest = read_signature_manifest()
+                    db_path = get_signature_db_path(manifest)
+            except Exception as e:
+                log_activity(f"Error converting signatures: {str(e)}", "ERROR")
+            
+            version = str(manifest["version"])
+            current = self.store
+            if not force and current is not None and current.version == version:
+                return current
+            
+            try:
+                if current is not None and current.path == db_path:
+                    # Same base database: rebuild only the overlay
+                    store = current.derive(keep_overlay=False)
+                else:
+                    if not os.path.exists(db_path):
+                        write_signature_db({}, db_path)
+                    store = SignatureStore(db_path)
+                    store.bloom = load_signature_bloom(store)
+                try:
+                    for delta in read_signature_journal(manifest):
+                        store.apply_delta(delta)
+                    store.version = version
+                except Exception as e:
+                    # Fall back to the base database rather than a partial overlay
+                    log_activity(f"Error loading signature deltas: {str(e)}", "ERROR")
+                    store = store.derive(keep_overlay=False)
+                    store.version = str(manifest["base_version"])
+            except Exception as e:
+                log_activity(f"Error loading signatures: {str(e)}", "ERROR")
+                if current is not None:
+                    return current
+                raise
+            
+            self.publish(store)
+            return store
+
+signature_handle = SignatureHandle()
+
+def get_signature_store():
+    return signature_handle.refresh()
+
+# Persistent cache of scan verdicts keyed by file identity. The scanner and
+# real-time protection each open their own connection, so writes are
+# committed within COMMIT_SECONDS to keep the SQLite write lock short, and
+# cache hits only refresh last_used in memory until the next commit.
+class ScanCache:
+    COMMIT_INTERVAL = 1000  # Most writes batched per transaction
+    COMMIT_SECONDS = 0.25  # Longest a transaction stays open
+    
+    def __init__(self, db_path=SCAN_CACHE_FILE, max_entries=DEFAULT_SCAN_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.pending_writes = 0
+        self.first_pending = 0
+        self.writes_since_evict = 0
+        self.touched = {}
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, file_id INTEGER, "
+            "md5 TEXT, sha1 TEXT, sha256 TEXT, verdict TEXT, "
+            "signature_version TEXT, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+        self.conn.commit()
+    
+    def lookup(self, file_path, stat, signature_version):
+        # Return the cached entry if the file and detection rules are unchanged.
+        # When only the signatures changed the entry comes back with "stale" set
+        # and its verdict must go through refresh_cached_verdict.
+        # Cache errors only cost a rescan, they never stop one.
+        with self.lock:
+            try:
+                row = self.conn.execute(
+                    "SELECT size, mtime, file_id, md5, sha1, sha256, verdict, signature_version "
+                    "FROM verdicts WHERE path = ?", (file_path,)
+                ).fetchone()
+                if row is None:
+                    return None
+                # st_ino is 0 in os.scandir results on Windows, only compare real file IDs
+                if (row[0] != stat.st_size or row[1] != stat.st_mtime_ns or
+                    (row[2] and stat.st_ino and row[2] != stat.st_ino)):
+                    return None
+                stale = row[7] != signature_version
+                if stale and (row[7] or "").partition(":")[2] != signature_version.partition(":")[2]:
+                    # YARA rules or heuristics changed, the file has to be read again
+                    return None
+                self.touched[file_path] = time.time()
+                if len(self.touched) >= self.COMMIT_INTERVAL:
+                    self._commit()
+                else:
+                    self._commit_due()
+                return {
+                    "hashes": {"md5": row[3], "sha1": row[4], "sha256": row[5]},
+                    "verdict": row[6],
+                    "stale": stale
+                }
+            except sqlite3.Error as e:
+                log_activity(f"Scan cache lookup failed for {file_path}: {str(e)}", "ERROR")
+                return None
+    
+    def store(self, file_path, stat, hashes, verdict, signature_version):
+        with self.lock:
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino,
+                     hashes["md5"], hashes["sha1"], hashes["sha256"],
+                     verdict, signature_version, time.time())
+                )
+                self.touched.pop(file_path, None)
+                self.writes_since_evict += 1
+                if not self.pending_writes:
+                    self.first_pending = time.time()
+                self.pending_writes += 1
+                if self.writes_since_evict > max(1000, self.max_entries // 10):
+                    self._evict()
+                elif self.pending_writes >= self.COMMIT_INTERVAL:
+                    self._commit()
+                else:
+                    self._commit_due()
+            except sqlite3.Error as e:
+                self._rollback()
+                log_activity(f"Scan cache store failed for {file_path}: {str(e)}", "ERROR")
+    
+    def _commit_due(self):
+        # Commit once the open transaction, or the oldest unsaved hit, is old enough
+        if self.pending_writes and time.time() - self.first_pending >= self.COMMIT_SECONDS:
+            self._commit()
+        elif self.touched and time.time() - next(iter(self.touched.values())) >= self.COMMIT_SECONDS:
+            self._commit()
+    
+    def _commit(self):
+        if self.touched:
+            self.conn.executemany("UPDATE verdicts SET last_used = ? WHERE path = ?",
+                                  [(used, path) for path, used in self.touched.items()])
+            self.touched = {}
+        self.conn.commit()
+        self.pending_writes = 0
+    
+    def _rollback(self):
+        try:
+            self.conn.rollback()
+        except sqlite3.Error:
+            pass
+        self.pending_writes = 0
+    
+    def _evict(self):
+        # Drop the least recently used entries above the size cap
+        count = self.conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM verdicts WHERE path IN "
+                "(SELECT path FROM verdicts ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+        self._commit()
+        self.writes_since_evict = 0
+    
+    def flush(self):
+        with self.lock:
+            try:
+                if self.writes_since_evict:
+                    self._evict()
+                elif self.pending_writes or self.touched:
+                    self._commit()
+            except sqlite3.Error as e:
+                self._rollback()
+                log_activity(f"Scan cache flush failed: {str(e)}", "ERROR")
+    
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+def open_scan_cache(settings):
+    try:
+        return ScanCache(max_entries=settings.get("scan_cache_max_entries", DEFAULT_SCAN_CACHE_ENTRIES))
+    except Exception as e:
+        log_activity(f"Error opening scan cache: {str(e)}", "ERROR")
+        return None
+
+# Per-root index of (size, mtime) for every clean file seen by an
+# incremental scan. Files are grouped by directory so one query returns
+# everything known about the directory being listed.
+class ScanIndex:
+    COMMIT_INTERVAL = 1000  # Writes batched per transaction
+    
+    def __init__(self, db_path=SCAN_INDEX_FILE):
+        self.lock = threading.Lock()
+        self.pending_writes = 0
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "root TEXT, directory TEXT, name TEXT, size INTEGER, mtime INTEGER, "
+            "PRIMARY KEY (root, directory, name)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+    
+    def directory(self, root, directory):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, size, mtime FROM files WHERE root = ? AND directory = ?", (root, directory)
+            ).fetchall()
+        return {name: (size, mtime) for name, size, mtime in rows}
+    
+    def record(self, root, file_path, stat):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (root, os.path.dirname(file_path), os.path.basename(file_path), stat.st_size, stat.st_mtime_ns)
+            )
+            self._write_done()
+    
+    def forget(self, root, directory, names):
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM files WHERE root = ? AND directory = ? AND name = ?",
+                [(root, directory, name) for name in names]
+            )
+            self._write_done()
+    
+    # Drop directories that were not seen by a completed walk of the root
+    def prune(self, root, visited_directories):
+        with self.lock:
+            directories = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT directory FROM files WHERE root = ?", (root,))]
+            self.conn.executemany(
+                "DELETE FROM files WHERE root = ? AND directory = ?",
+                [(root, directory) for directory in directories if directory not in visited_directories]
+            )
+            self.conn.commit()
+            self.pending_writes = 0
+    
+    def _write_done(self):
+        self.pending_writes += 1
+        if self.pending_writes >= self.COMMIT_INTERVAL:
+            self.conn.commit()
+            self.pending_writes = 0
+    
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+# Exclusions compiled once: paths go into a trie of normalized path
+# components, entries with wildcards become glob patterns. Globs and bare
+# names without a path separator match file and directory names, globs
+# with one match whole paths.
+class ExclusionMatcher:
+    def __init__(self, exclusions):
+        self.trie = {}
+        name_globs = []
+        path_globs = []
+        for exclusion in exclusions:
+            if not exclusion:
+                continue
+            has_separator = "/" in exclusion or "\\" in exclusion
+            if any(char in exclusion for char in "*?[") or not has_separator:
+                pattern = fnmatch.translate(os.path.normcase(exclusion))
+                if has_separator:
+                    path_globs.append(pattern)
+                else:
+                    name_globs.append(pattern)
+            else:
+                node = self.trie
+                for part in self.split(exclusion):
+                    node = node.setdefault(part, {})
+                node[None] = True  # Everything below this node is excluded
+        self.name_glob = re.compile("|".join(name_globs)) if name_globs else None
+        self.path_glob = re.compile("|".join(path_globs)) if path_globs else None
+    
+    @staticmethod
+    def split(path):
+        return [part for part in os.path.normcase(os.path.abspath(path)).split(os.sep) if part]
+    
+    def glob_excluded(self, path, name):
+        if self.name_glob is not None and self.name_glob.match(os.path.normcase(name)):
+            return True
+        return self.path_glob is not None and self.path_glob.match(os.path.normcase(path)) is not None
+    
+    # Return (excluded, trie node) for a path. Every component is checked
+    # against the trie and the globs, so a file inside an excluded directory
+    # is excluded too. The node is passed to child() while walking so
+    # entries are checked without re-splitting their path.
+    def lookup(self, path):
+        node = self.trie
+        if None in node:
+            return True, None
+        prefix = None
+        for part in os.path.normcase(os.path.abspath(path)).split(os.sep):
+            prefix = part if prefix is None else prefix + os.sep + part
+            if not part:
+                continue
+            if node is not None:
+                node = node.get(part)
+                if node is not None and None in node:
+                    return True, None
+            if self.glob_excluded(prefix, part):
+                return True, None
+        return False, node
+    
+    def child(self, node, path, name):
+        if node is not None:
+            node = node.get(os.path.normcase(name))
+            if node is not None and None in node:
+                return True, None
+        return self.glob_excluded(path, name), node
+    
+    def matches(self, path):
+        return self.lookup(path)[0]
+
+# Exclusions from the settings. The settings tab stores them under
+# "exclusions", the default settings under "excluded_paths".
+def get_exclusions(settings):
+    exclusions = list(settings.get("excluded_paths", []))
+    exclusions += [path for path in settings.get("exclusions", []) if path not in exclusions]
+    return exclusions
+
+# Disk-order scheduling for rotational media
+SCAN_SCHEDULE_BATCH = 2048  # Files sorted together before they are read
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_HEADER = struct.Struct("<QQIIII")
+FIEMAP_EXTENT = struct.Struct("<QQQQQIIII")
+FIEMAP_EXTENT_UNPLACED = 0x2 | 0x4 | 0x200  # Unknown, delayed allocation, inline data
+IOCTL_STORAGE_QUERY_PROPERTY = 0x2D1400
+STORAGE_DEVICE_SEEK_PENALTY_PROPERTY = 7
+
+def linux_is_rotational(path):
+    device_id = os.stat(path).st_dev
+    device = os.path.realpath(f"/sys/dev/block/{os.major(device_id)}:{os.minor(device_id)}")
+    # Partitions have no queue of their own, their parent disk does
+    for candidate in (device, os.path.dirname(device)):
+        rotational = os.path.join(candidate, "queue", "rotational")
+        if os.path.exists(rotational):
+            with open(rotational, 'r') as f:
+                return f.read().strip() == "1"
+    return None
+
+def windows_is_rotational(path):
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if not drive or drive.startswith("\\\\"):
+        return None
+    kernel32 = ctypes.windll.kernel32
+    kernel32.CreateFileW.restype = ctypes.c_void_p
+    kernel32.DeviceIoControl.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_void_p, ctypes.c_ulong,
+                                         ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong), ctypes.c_void_p]
+    kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+    # No access rights are needed to query the device, share read/write, OPEN_EXISTING
+    handle = kernel32.CreateFileW(f"\\\\.\\{drive}", 0, 3, None, 3, 0, None)
+    if handle is None or handle == ctypes.c_void_p(-1).value:
+        return None
+    try:
+        query = ctypes.create_string_buffer(struct.pack("<II4x", STORAGE_DEVICE_SEEK_PENALTY_PROPERTY, 0))
+        descriptor = ctypes.create_string_buffer(12)  # Version, Size, IncursSeekPenalty
+        returned = ctypes.c_ulong(0)
+        if not kernel32.DeviceIoControl(handle, IOCTL_STORAGE_QUERY_PROPERTY, query, len(query.raw),
+                                        descriptor, len(descriptor.raw), ctypes.byref(returned), None):
+            return None
+        return descriptor.raw[8] != 0
+    finally:
+        kernel32.CloseHandle(handle)
+
+# True for spinning disks, False for SSDs, None if it cannot be told
+def is_rotational(path):
+    try:
+        if platform.system() == "Linux":
+            return linux_is_rotational(path)
+        if platform.system() == "Windows":
+            return windows_is_rotational(path)
+    except Exception as e:
+        log_activity(f"Error detecting media type of {path}: {str(e)}", "ERROR")
+    return None
+
+# Physical offset of the first extent of a file (Linux FIEMAP), or None
+def physical_offset(file_path):
+    if fcntl is None:
+        return None
+    try:
+        request = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+        FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+        with open(file_path, 'rb', buffering=0) as f:
+            fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, request, True)
+        if FIEMAP_HEADER.unpack_from(request, 0)[3] == 0:
+            return None
+        extent = FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size)
+        if extent[5] & FIEMAP_EXTENT_UNPLACED:
+            return None
+        return extent[1]
+    except OSError:
+        return None
+
+# Sort key for disk-order scheduling: the physical offset where the
+# filesystem reports it, otherwise the inode number
+def disk_order_key(file_path, stat):
+    offset = physical_offset(file_path)
+    if offset is not None:
+        return (0, offset)
+    inode = stat.st_ino
+    if not inode:
+        # os.scandir leaves st_ino empty on Windows
+        try:
+            inode = os.stat(file_path).st_ino
+        except OSError:
+            inode = 0
+    return (1, inode)
+
+# File counts of the last completed scan of every root, used for progress
+def load_scan_totals():
+    try:
+        with open(SCAN_TOTALS_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_scan_totals(totals):
+    try:
+        with open(SCAN_TOTALS_FILE, 'w') as f:
+            json.dump(totals, f)
+    except Exception as e:
+        log_activity(f"Error saving scan totals: {str(e)}", "ERROR")
+
+# Bounded queue feeding one scan pipeline stage, with throughput counters
+class PipelineStage:
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.items = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.start_time = time.time()
+    
+    def put(self, item, stop_check):
+        # Blocks while the queue is full (backpressure), unless the scan stops
+        while not stop_check():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def get(self, stop_check):
+        while not stop_check():
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+    
+    def record(self, size, elapsed):
+        with self.lock:
+            self.items += 1
+            self.bytes += size
+            self.busy_time += elapsed
+    
+    def stats(self):
+        with self.lock:
+            wall_time = max(time.time() - self.start_time, 0.001)
+            return {
+                "queue_depth": self.queue.qsize(),
+                "items": self.items,
+                "bytes": self.bytes,
+                "busy_seconds": round(self.busy_time, 3),
+                "items_per_second": round(self.items / wall_time, 1),
+                "mb_per_second": round(self.bytes / wall_time / (1024 * 1024), 2)
+            }
+
+# Caps the number of file bytes being read or analyzed at the same time
+class ByteBudget:
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+    
+    def acquire(self, size, stop_check):
+        # Files larger than the whole budget are admitted alone
+        size = min(size, self.limit)
+        with self.condition:
+            while self.in_flight and self.in_flight + size > self.limit:
+                if stop_check():
+                    return 0
+                self.condition.wait(0.1)
+            self.in_flight += size
+        return size
+    
+    def release(self, size):
+        if size:
+            with self.condition:
+                self.in_flight -= size
+                self.condition.notify_all()
 
 # File scanning class
 class FileScannerThread(QThread):
     update_progress = pyqtSignal(int, int, str)
     scan_complete = pyqtSignal(dict)
     threat_found = pyqtSignal(str, str)
+    stage_stats = pyqtSignal(dict)
+    
+    STATS_INTERVAL = 1.0  # Seconds between stage_stats emissions
     
-    def __init__(self, paths, scan_archives=True):
+    def __init__(self, paths, scan_archives=True, incremental=False):
         super().__init__()
         self.paths = paths
         self.scan_archives = scan_archives
+        self.incremental = incremental
         self.stop_requested = False
-        self.signatures = load_signatures()
         self.settings = load_settings()
-        self.excluded_paths = self.settings.get("excluded_paths", [])
+        self.exclusions = ExclusionMatcher(get_exclusions(self.settings))
+        self.scan_cache = None
+        get_signature_store()
+        get_heuristic_rules()
+        yara_engine.refresh(self.settings)
         
     def run(self):
         start_time = time.time()
-        scanned_files = 0
-        infected_files = []
-        total_files = self.count_files(self.paths)
-        
-        for path in self.paths:
-            if os.path.isfile(path):
-                self.scan_file(path, scanned_files, total_files, infected_files)
-                scanned_files += 1
-            elif os.path.isdir(path):
-                for root, dirs, files in os.walk(path):
-                    # Skip excluded paths
-                    if any(os.path.abspath(root).startswith(os.path.abspath(excluded)) for excluded in self.excluded_paths):
-                        continue
-                        
-                    for file in files:
-                        if self.stop_requested:
-                            break
-                            
-                        file_path = os.path.join(root, file)
-                        self.scan_file(file_path, scanned_files, total_files, infected_files)
-                        scanned_files += 1
-                        
-                    if self.stop_requested:
-                        break
+        self.scan_cache = open_scan_cache(self.settings)
+        self.scanned_files = 0
+        self.infected_files = []
+        self.discovered_files = 0
+        self.walk_finished = False
+        self.root_counts = {}
+        self.visited_directories = {}
+        self.scan_index = None
+        self.heuristic_stats = heuristic_engine.new_statistics()
+        if self.incremental:
+            # Only added and modified files are queued, so there is no useful estimate
+            self.estimated_files = 0
+            try:
+                self.scan_index = ScanIndex()
+            except Exception as e:
+                log_activity(f"Error opening scan index, scanning everything: {str(e)}", "ERROR")
+        else:
+            self.estimated_files = self.estimate_files(self.paths)
+        
+        # The scan runs as a pipeline: walk -> read -> analyze -> report.
+        # Stages are connected by bounded queues so a slow stage applies
+        # backpressure instead of letting work pile up in memory.
+        self.read_workers = max(1, int(self.settings.get("scan_workers", os.cpu_count() or 1)))
+        self.analyze_workers = max(1, int(self.settings.get("scan_analyze_workers", max(1, self.read_workers // 2))))
+        if self.settings.get("scan_use_processes", False):
+            self.executor = ProcessPoolExecutor(max_workers=self.read_workers)
+        else:
+            self.executor = None
+        self.byte_budget = ByteBudget(int(self.settings.get("scan_max_inflight_mb", 256)) * 1024 * 1024)
+        self.stages = {
+            "walk": PipelineStage("walk", 0),
+            "read": PipelineStage("read", 4096),
+            "analyze": PipelineStage("analyze", self.read_workers * 4),
+            "report": PipelineStage("report", 1024)
+        }
+        self.stage_lock = threading.Lock()
+        self.readers_left = self.read_workers
+        self.analyzers_left = self.analyze_workers
+        
+        threads = [threading.Thread(target=self.walk_stage, daemon=True)]
+        threads += [threading.Thread(target=self.read_stage, daemon=True) for _ in range(self.read_workers)]
+        threads += [threading.Thread(target=self.analyze_stage, daemon=True) for _ in range(self.analyze_workers)]
+        for thread in threads:
+            thread.start()
+        
+        self.report_stage()
+        
+        for thread in threads:
+            thread.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        
+        if self.scan_cache is not None:
+            self.scan_cache.close()
+            self.scan_cache = None
+        
+        if self.walk_finished and not self.stop_requested:
+            if self.scan_index is not None:
+                # Forget directories that were deleted or excluded since the last scan
+                for root, directories in self.visited_directories.items():
+                    self.scan_index.prune(root, directories)
+            else:
+                # Remember how many files each root had for the next progress estimate
+                totals = load_scan_totals()
+                totals.update(self.root_counts)
+                save_scan_totals(totals)
+        if self.scan_index is not None:
+            self.scan_index.close()
+            self.scan_index = None
         
         end_time = time.time()
         scan_duration = end_time - start_time
         
+        stage_stats = self.pipeline_stats()
+        self.stage_stats.emit(stage_stats)
+        log_activity(f"Scan pipeline stats: {json.dumps(stage_stats)}")
+        heuristic_stats = self.heuristic_stats.statistics()
+        log_activity(f"Heuristic check stats: {json.dumps(heuristic_stats)}")
+        rule_hits = self.heuristic_stats.rule_statistics()
+        log_activity(f"Heuristic rule hits: {json.dumps(rule_hits)}")
+        
         # Save scan results to history
         scan_result = {
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "scanned_files": scanned_files,
-            "infected_files": len(infected_files),
+            "scanned_files": self.scanned_files,
+            "infected_files": len(self.infected_files),
             "duration": scan_duration,
-            "infected_file_paths": infected_files
+            "infected_file_paths": self.infected_files,
+            "stage_stats": stage_stats,
+            "heuristic_stats": heuristic_stats,
+            "heuristic_rule_hits": rule_hits,
+            "incremental": self.incremental
         }
         
         try:
@@ -283,180 +2368,938 @@ class FileScannerThread(QThread):
         
         self.scan_complete.emit(scan_result)
     
-    def count_files(self, paths):
-        count = 0
-        for path in paths:
-            if os.path.isfile(path):
-                count += 1
-            elif os.path.isdir(path):
-                for root, dirs, files in os.walk(path):
-                    # Skip excluded paths
-                    if any(os.path.abspath(root).startswith(os.path.abspath(excluded)) for excluded in self.excluded_paths):
-                        continue
-                    count += len(files)
-        return count
+    def pipeline_stats(self):
+        stats = {name: stage.stats() for name, stage in self.stages.items() if name != "walk"}
+        # The walk feeds the read queue directly, so it reports its listing work instead
+        walk = self.stages["walk"].stats()
+        stats["walk"] = {
+            "directories": walk["items"],
+            "files": self.discovered_files,
+            "scandir_seconds": walk["busy_seconds"],
+            "directories_per_second": walk["items_per_second"]
+        }
+        stats["in_flight_bytes"] = self.byte_budget.in_flight
+        return stats
+    
+    def is_stopped(self):
+        return self.stop_requested
+    
+    # Single pass over a scan root. os.scandir gives the entry type without a
+    # stat call, and the stat of each file is passed on to the read stage.
+    # Excluded directories are pruned before they are listed. Files are
+    # produced one directory at a time.
+    def iter_files(self, path):
+        path = os.path.abspath(path)
+        excluded, node = self.exclusions.lookup(path)
+        if excluded:
+            return
+        if os.path.isfile(path):
+            yield path, os.stat(path)
+            return
+        
+        root = os.path.normcase(path)
+        pending = [(path, node)]
+        while pending and not self.stop_requested:
+            directory, node = pending.pop()
+            files = []
+            started = time.time()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            excluded, child = self.exclusions.child(node, entry.path, entry.name)
+                            if excluded:
+                                continue
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append((entry.path, child))
+                            elif entry.is_file():
+                                files.append((entry.path, entry.name, entry.stat()))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            finally:
+                self.stages["walk"].record(0, time.time() - started)
+            
+            if self.scan_index is not None:
+                files = self.changed_files(root, directory, files)
+            for file_path, _, stat in files:
+                yield file_path, stat
+    
+    # Compare a directory listing with the scan index: keep added and
+    # modified files and drop index entries of deleted ones
+    def changed_files(self, root, directory, files):
+        self.visited_directories.setdefault(root, set()).add(directory)
+        known = self.scan_index.directory(root, directory)
+        changed = []
+        for file_path, name, stat in files:
+            if known.pop(name, None) != (stat.st_size, stat.st_mtime_ns):
+                changed.append((file_path, name, stat))
+        if known:
+            self.scan_index.forget(root, directory, list(known))
+        return changed
+    
+    def estimate_files(self, paths):
+        totals = load_scan_totals()
+        return sum(totals.get(os.path.normcase(os.path.abspath(path)), 0) for path in paths)
     
-    def scan_file(self, file_path, current, total, infected_files):
+    # Progress total: the file counts of the previous scan of the same roots
+    # until the walk has found more files than that, or has finished
+    def progress_total(self):
+        if self.walk_finished:
+            return self.discovered_files
+        return max(self.estimated_files, self.discovered_files)
+    
+    def walk_stage(self):
         try:
-            # Skip very large files (>100MB) for performance
-            if os.path.getsize(file_path) > 100 * 1024 * 1024:
-                self.update_progress.emit(current, total, f"Skipping large file: {file_path}")
-                return
+            for path in self.paths:
+                count = 0
+                root = os.path.normcase(os.path.abspath(path))
+                files = self.iter_files(path)
+                if self.use_disk_order(path):
+                    files = self.disk_ordered(files)
+                for file_path, stat in files:
+                    if self.stop_requested:
+                        break
+                    
+                    count += 1
+                    self.discovered_files += 1
+                    self.stages["read"].put((file_path, stat, root), self.is_stopped)
                 
-            self.update_progress.emit(current, total, f"Scanning: {file_path}")
+                if self.stop_requested:
+                    break
+                self.root_counts[root] = count
+            else:
+                self.walk_finished = True
+        except Exception as e:
+            log_activity(f"Error walking scan paths: {str(e)}", "ERROR")
+        
+        # One end marker per reader
+        for _ in range(self.read_workers):
+            self.stages["read"].put(None, self.is_stopped)
+    
+    # The "scan_schedule" setting is "walk", "disk_order" or "auto", which
+    # uses disk order only on rotational media
+    def use_disk_order(self, path):
+        schedule = self.settings.get("scan_schedule", "auto")
+        if schedule == "disk_order":
+            return True
+        if schedule == "auto" and is_rotational(path):
+            log_activity(f"Rotational media detected, scanning {path} in disk order")
+            return True
+        return False
+    
+    # Reorder files in batches by their position on disk to reduce seeks
+    def disk_ordered(self, files):
+        batch = []
+        for file_path, stat in files:
+            batch.append((disk_order_key(file_path, stat), file_path, stat))
+            if len(batch) >= SCAN_SCHEDULE_BATCH:
+                batch.sort(key=lambda item: item[0])
+                for _, batch_path, batch_stat in batch:
+                    yield batch_path, batch_stat
+                batch = []
+        batch.sort(key=lambda item: item[0])
+        for _, batch_path, batch_stat in batch:
+            yield batch_path, batch_stat
+    
+    def read_stage(self):
+        stage = self.stages["read"]
+        while True:
+            item = stage.get(self.is_stopped)
+            if item is None:
+                break
             
-            # Calculate file hashes
-            with open(file_path, 'rb') as f:
-                data = f.read()
-                md5_hash = hashlib.md5(data).hexdigest()
-                sha1_hash = hashlib.sha1(data).hexdigest()
-                sha256_hash = hashlib.sha256(data).hexdigest()
+            started = time.time()
+            file_path, stat, root = item
+            entry = {"path": file_path, "stat": stat, "root": root, "error": False, "hashes": None, "heuristic": None, "yara_matches": [],
+                     "file_type": "unknown", "pe_info": None, "budget": 0}
+            try:
+                # Reuse the previous verdict if the file is unchanged; after a signature
+                # update its cached digests are checked against the new signatures
+                cached = None
+                if self.scan_cache is not None:
+                    signatures = signature_handle.current()
+                    cached = self.scan_cache.lookup(file_path, entry["stat"], detection_version(signatures))
+                    if cached is not None and cached["stale"]:
+                        cached["verdict"] = refresh_cached_verdict(cached, signatures)
+                        if cached["verdict"] is None:
+                            cached = None
+                if cached is not None:
+                    entry["verdict"] = cached["verdict"]
+                    stage.record(0, time.time() - started)
+                    self.stages["report"].put(entry, self.is_stopped)
+                    continue
+                
+                entry["budget"] = self.byte_budget.acquire(entry["stat"].st_size, self.is_stopped)
+                if self.executor is not None:
+                    result = self.executor.submit(analyze_file_contents, file_path).result()
+                else:
+                    result = analyze_file_contents(file_path)
+                entry["hashes"], entry["heuristic"], entry["file_type"], entry["pe_info"] = result
+                heuristic_engine.record(entry["heuristic"]["timings"], entry["heuristic"]["rule_hits"])
+                self.heuristic_stats.record(entry["heuristic"]["timings"], entry["heuristic"]["rule_hits"])
+            except Exception as e:
+                entry["error"] = True
+                log_activity(f"Error scanning file {file_path}: {str(e)}", "ERROR")
             
-            # Check against known signatures
-            if (md5_hash in self.signatures["md5"] or 
-                sha1_hash in self.signatures["sha1"] or 
-                sha256_hash in self.signatures["sha256"]):
-                infected_files.append(file_path)
-                self.threat_found.emit(file_path, "Malware signature match")
-                log_activity(f"Malware detected: {file_path}", "WARNING")
-                return
+            stage.record(entry["stat"].st_size if entry["stat"] else 0, time.time() - started)
+            if entry["hashes"] is None:
+                # Nothing to analyze, report the file as scanned
+                self.byte_budget.release(entry["budget"])
+                entry["budget"] = 0
+                entry["verdict"] = ""
+                self.stages["report"].put(entry, self.is_stopped)
+            else:
+                self.stages["analyze"].put(entry, self.is_stopped)
+        
+        # The last reader to finish ends the analyze stage
+        with self.stage_lock:
+            self.readers_left -= 1
+            last = self.readers_left == 0
+        if last:
+            for _ in range(self.analyze_workers):
+                self.stages["analyze"].put(None, self.is_stopped)
+    
+    def analyze_stage(self):
+        stage = self.stages["analyze"]
+        while True:
+            entry = stage.get(self.is_stopped)
+            if entry is None:
+                break
             
-            # Basic heuristic analysis (check for suspicious patterns)
-            if self.heuristic_scan(data, file_path):
-                infected_files.append(file_path)
-                self.threat_found.emit(file_path, "Suspicious behavior detected")
-                log_activity(f"Suspicious file detected: {file_path}", "WARNING")
-                return
+            started = time.time()
+            file_path = entry["path"]
+            hashes = entry["hashes"]
+            entry["verdict"] = ""
+            try:
+                # Check against known signatures
+                signatures = signature_handle.current()
+                if signatures.match(hashes):
+                    entry["verdict"] = "Malware signature match"
+                elif entry["file_type"] not in HASH_ONLY_FILE_TYPES:
+                    # YARA rules run on the memory-mapped file
+                    entry["yara_matches"] = yara_engine.match(file_path, entry["stat"].st_size)
+                    if entry["yara_matches"]:
+                        entry["verdict"] = "YARA rule match"
+                    # Basic heuristic analysis (check for suspicious patterns)
+                    elif entry["heuristic"]["detected"]:
+                        entry["verdict"] = "Suspicious behavior detected"
                 
-        except Exception as e:
-            log_activity(f"Error scanning file {file_path}: {str(e)}", "ERROR")
-    
-    def heuristic_scan(self, data, file_path):
-        # Simple heuristic checks for suspicious patterns
-        suspicious_patterns = [
-            b"CreateRemoteThread",
-            b"VirtualAllocEx",
-            b"WriteProcessMemory",
-            b"ShellExecute",
-            b"WScript.Shell",
-            b"cmd.exe /c",
-            b"powershell -e",
-            b"net user /add",
-            b"reg add HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Run"
-        ]
-        
-        # Check file extension
-        _, ext = os.path.splitext(file_path)
-        if ext.lower() in [".exe", ".dll", ".bat", ".vbs", ".ps1"]:
-            # Check for suspicious patterns in executable files
-            for pattern in suspicious_patterns:
-                if pattern in data:
-                    return True
-        
-        return False
+                self.cache_verdict(file_path, entry["stat"], hashes, entry["verdict"], detection_version(signatures))
+            except Exception as e:
+                entry["error"] = True
+                log_activity(f"Error scanning file {file_path}: {str(e)}", "ERROR")
+            
+            self.byte_budget.release(entry["budget"])
+            entry["budget"] = 0
+            stage.record(entry["stat"].st_size, time.time() - started)
+            self.stages["report"].put(entry, self.is_stopped)
+        
+        # The last analyzer to finish ends the report stage
+        with self.stage_lock:
+            self.analyzers_left -= 1
+            last = self.analyzers_left == 0
+        if last:
+            self.stages["report"].put(None, self.is_stopped)
+    
+    def report_stage(self):
+        # Runs on the scanner thread itself so signals are emitted in order
+        stage = self.stages["report"]
+        last_stats = time.time()
+        while True:
+            entry = stage.get(self.is_stopped)
+            if entry is None:
+                break
+            
+            started = time.time()
+            file_path = entry["path"]
+            self.update_progress.emit(self.scanned_files, self.progress_total(), f"Scanning: {file_path}")
+            self.scanned_files += 1
+            
+            if entry["verdict"]:
+                self.infected_files.append(file_path)
+                self.threat_found.emit(file_path, entry["verdict"])
+                if entry["verdict"] == "Malware signature match":
+                    log_activity(f"Malware detected: {file_path}", "WARNING")
+                elif entry["yara_matches"]:
+                    log_activity(f"YARA rule match: {file_path} ({', '.join(entry['yara_matches'])})", "WARNING")
+                elif entry["hashes"] is not None:
+                    matched = ", ".join(f"{name}@{offset}" for offset, name in entry["heuristic"]["findings"])
+                    matched = f"score {entry['heuristic']['score']}: {matched}"
+                    if entry["pe_info"] is not None and entry["pe_info"]["imphash"]:
+                        matched += f", imphash {entry['pe_info']['imphash']}"
+                    log_activity(f"Suspicious file detected: {file_path} ({matched})", "WARNING")
+            elif self.scan_index is not None and not entry["error"] and entry["root"] in self.visited_directories:
+                # Clean files are skipped by the next incremental scan until they change;
+                # threats stay out of the index so they are reported again
+                self.scan_index.record(entry["root"], file_path, entry["stat"])
+            
+            stage.record(0, time.time() - started)
+            if time.time() - last_stats >= self.STATS_INTERVAL:
+                self.stage_stats.emit(self.pipeline_stats())
+                last_stats = time.time()
+    
+    def cache_verdict(self, file_path, stat, hashes, verdict, signature_version):
+        if self.scan_cache is not None:
+            self.scan_cache.store(file_path, stat, hashes, verdict, signature_version)
     
     def stop(self):
         self.stop_requested = True
 
+# File watcher backends for real-time protection. read_events(timeout) waits
+# up to timeout seconds and returns (event, path, is_dir) tuples, where event
+# is create, modify, close_write, moved_to or delete. An "overflow" event with
+# no path means events were dropped and the watched directories must be listed
+# again. Backends with NATIVE_RECURSION watch a whole tree from one
+# add_watch(directory, recursive=True); the others watch single directories.
+class FileWatcher:
+    NAME = "base"
+    NATIVE_RECURSION = False
+    
+    def add_watch(self, directory, recursive=False):
+        raise NotImplementedError
+    
+    def remove_watch(self, directory):
+        pass
+    
+    def read_events(self, timeout):
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+# Linux inotify through libc
+class InotifyWatcher(FileWatcher):
+    NAME = "inotify"
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENTS = [(IN_CREATE, "create"), (IN_MODIFY, "modify"), (IN_CLOSE_WRITE, "close_write"),
+              (IN_MOVED_TO, "moved_to"), (IN_DELETE, "delete"), (IN_MOVED_FROM, "delete")]
+    EVENT_HEADER = struct.Struct("iIII")
+    
+    def __init__(self):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+    
+    def add_watch(self, directory, recursive=False):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.watches[wd] = directory
+    
+    def remove_watch(self, directory):
+        for wd, watched in list(self.watches.items()):
+            if watched == directory:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+    
+    def read_events(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        
+        events = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\x00")
+            offset += length
+            
+            if mask & self.IN_Q_OVERFLOW:
+                events.append(("overflow", None, False))
+                continue
+            if mask & self.IN_IGNORED:
+                # The watched directory itself went away
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            is_dir = bool(mask & self.IN_ISDIR)
+            for flag, event in self.EVENTS:
+                if mask & flag:
+                    events.append((event, path, is_dir))
+        return events
+    
+    def close(self):
+        os.close(self.fd)
+
+# Windows ReadDirectoryChangesW, one blocking reader thread per watched directory
+class WindowsChangeWatcher(FileWatcher):
+    NAME = "ReadDirectoryChangesW"
+    NATIVE_RECURSION = True
+    FILE_LIST_DIRECTORY = 0x1
+    FILE_SHARE_ALL = 0x7
+    OPEN_EXISTING = 3
+    FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+    # File name, directory name, size, last write and creation changes
+    NOTIFY_FILTER = 0x1 | 0x2 | 0x8 | 0x10 | 0x40
+    ACTIONS = {1: "create", 2: "delete", 3: "modify", 4: "delete", 5: "moved_to"}
+    
+    def __init__(self):
+        self.kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self.kernel32.CreateFileW.restype = ctypes.c_void_p
+        self.kernel32.ReadDirectoryChangesW.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_ulong,
+            ctypes.POINTER(ctypes.c_ulong), ctypes.c_void_p, ctypes.c_void_p]
+        self.kernel32.CancelIoEx.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        self.kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+        self.events = queue.Queue()
+        self.handles = []
+        self.running = True
+    
+    def add_watch(self, directory, recursive=False):
+        handle = self.kernel32.CreateFileW(directory, self.FILE_LIST_DIRECTORY, self.FILE_SHARE_ALL, None,
+                                           self.OPEN_EXISTING, self.FILE_FLAG_BACKUP_SEMANTICS, None)
+        if handle is None or handle == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_last_error(), f"Cannot watch {directory}")
+        self.handles.append(handle)
+        threading.Thread(target=self.watch_directory, args=(directory, handle, recursive), daemon=True).start()
+    
+    def watch_directory(self, directory, handle, recursive):
+        buffer = ctypes.create_string_buffer(64 * 1024)
+        returned = ctypes.c_ulong(0)
+        while self.running:
+            if not self.kernel32.ReadDirectoryChangesW(handle, buffer, len(buffer), recursive, self.NOTIFY_FILTER,
+                                                       ctypes.byref(returned), None, None):
+                # Cancelled by close() or the directory was removed
+                break
+            if returned.value == 0:
+                self.events.put(("overflow", None, False))
+                continue
+            
+            # FILE_NOTIFY_INFORMATION records: next offset, action, name length, UTF-16 name
+            data = buffer.raw[:returned.value]
+            offset = 0
+            while True:
+                next_offset, action, length = struct.unpack_from("<III", data, offset)
+                name = data[offset + 12:offset + 12 + length].decode("utf-16-le")
+                event = self.ACTIONS.get(action)
+                if event is not None:
+                    path = os.path.join(directory, name)
+                    self.events.put((event, path, event != "delete" and os.path.isdir(path)))
+                if not next_offset:
+                    break
+                offset += next_offset
+    
+    def read_events(self, timeout):
+        try:
+            events = [self.events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+    
+    def close(self):
+        self.running = False
+        for handle in self.handles:
+            self.kernel32.CancelIoEx(handle, None)
+            self.kernel32.CloseHandle(handle)
+        self.handles = []
+
+# Fallback when no change notification API is available: list the watched
+# directories every POLL_INTERVAL seconds and report what changed
+class PollingWatcher(FileWatcher):
+    NAME = "polling"
+    POLL_INTERVAL = 2.0
+    
+    def __init__(self):
+        self.snapshots = {}
+        self.next_poll = time.time() + self.POLL_INTERVAL
+    
+    def snapshot(self, directory):
+        entries = {}
+        try:
+            with os.scandir(directory) as listing:
+                for entry in listing:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns, is_dir)
+        except OSError:
+            pass
+        return entries
+    
+    def add_watch(self, directory, recursive=False):
+        self.snapshots[directory] = self.snapshot(directory)
+    
+    def remove_watch(self, directory):
+        self.snapshots.pop(directory, None)
+    
+    def read_events(self, timeout):
+        wait = self.next_poll - time.time()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        self.next_poll = time.time() + self.POLL_INTERVAL
+        
+        events = []
+        for directory, previous in list(self.snapshots.items()):
+            current = self.snapshot(directory)
+            for name, state in current.items():
+                old_state = previous.get(name)
+                if old_state is None:
+                    events.append(("create", os.path.join(directory, name), state[2]))
+                elif old_state != state:
+                    events.append(("modify", os.path.join(directory, name), state[2]))
+            for name, state in previous.items():
+                if name not in current:
+                    events.append(("delete", os.path.join(directory, name), state[2]))
+            self.snapshots[directory] = current
+        return events
+
+# Native watcher for this platform, falling back to polling
+def create_file_watcher():
+    try:
+        if platform.system() == "Linux":
+            return InotifyWatcher()
+        if platform.system() == "Windows":
+            return WindowsChangeWatcher()
+    except Exception as e:
+        log_activity(f"Native file watcher unavailable, falling back to polling: {str(e)}", "ERROR")
+    return PollingWatcher()
+
+# What real-time protection remembers about scanned files. Entries are
+# keyed by the hash of the path and hold one packed (size, mtime_ns, inode,
+# last seen) record. When the table is full the least recently seen tenth
+# is dropped in one go, and entries not seen within max_age are dropped by
+# prune(), which the monitor calls while idle.
+class MonitorState:
+    ENTRY = struct.Struct("<qqQI")
+    EVICT_FRACTION = 0.1
+    PRUNE_INTERVAL = 60  # Seconds between age sweeps
+    
+    def __init__(self, max_entries=DEFAULT_MONITOR_STATE_ENTRIES, max_age=DEFAULT_MONITOR_STATE_MAX_AGE):
+        self.max_entries = max(1, int(max_entries))
+        self.max_age = max_age
+        self.entries = {}
+        self.evicted = 0
+        self.last_prune = time.time()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def key(self, path):
+        return hash(os.path.normcase(path))
+    
+    def identity(self, stat):
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino & 0xFFFFFFFFFFFFFFFF
+    
+    def unchanged(self, path, stat):
+        key = self.key(path)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        identity = self.identity(stat)
+        if self.ENTRY.unpack(entry)[:3] != identity:
+            return False
+        self.entries[key] = self.ENTRY.pack(*identity, int(time.time()))
+        return True
+    
+    def record(self, path, stat):
+        if len(self.entries) >= self.max_entries:
+            self.evict(max(1, int(self.max_entries * self.EVICT_FRACTION)))
+        self.entries[self.key(path)] = self.ENTRY.pack(*self.identity(stat), int(time.time()))
+    
+    def forget(self, path):
+        self.entries.pop(self.key(path), None)
+    
+    def evict(self, count):
+        oldest = heapq.nsmallest(count, self.entries.items(), key=lambda item: self.ENTRY.unpack(item[1])[3])
+        for key, _ in oldest:
+            del self.entries[key]
+        self.evicted += len(oldest)
+    
+    def prune(self, force=False):
+        now = time.time()
+        if not force and now - self.last_prune < self.PRUNE_INTERVAL:
+            return
+        self.last_prune = now
+        cutoff = now - self.max_age
+        # Rebuilding also gives back the space of deleted slots
+        kept = {key: entry for key, entry in self.entries.items() if self.ENTRY.unpack(entry)[3] >= cutoff}
+        self.evicted += len(self.entries) - len(kept)
+        self.entries = kept
+    
+    def memory_usage(self):
+        # Keys are ints and entries fixed size bytes, so one of each stands for all
+        size = sys.getsizeof(self.entries)
+        if self.entries:
+            key, entry = next(iter(self.entries.items()))
+            size += len(self.entries) * (sys.getsizeof(key) + sys.getsizeof(entry))
+        return size
+    
+    def statistics(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "memory_bytes": self.memory_usage(),
+            "evicted": self.evicted
+        }
+
+# Names browsers and download managers write to until a download completes.
+# Real-time protection ignores them and scans the file once it is renamed.
+PARTIAL_DOWNLOAD_EXTENSIONS = [".crdownload", ".part", ".partial", ".download", ".opdownload"]
+
+# Events after which the file is complete, so no settling is needed. A
+# close_write is not one of them: installers and browsers reopen and append
+# to the same file several times, and each close only restarts the quiet period.
+SETTLED_EVENTS = ["moved_to"]
+
+# The "realtime_watch" setting lists {"path", "recursive", "max_depth"}
+# entries; a plain string watches that folder without recursion. Returns
+# (path, max_depth) pairs where 0 means only the folder itself.
+def get_realtime_watch(settings):
+    watch = []
+    for item in settings.get("realtime_watch") or default_realtime_watch():
+        if isinstance(item, str):
+            item = {"path": item}
+        path = os.path.expandvars(os.path.expanduser(item.get("path", "")))
+        if not path:
+            continue
+        max_depth = 0
+        if item.get("recursive", False):
+            max_depth = max(0, int(item.get("max_depth", DEFAULT_WATCH_MAX_DEPTH)))
+        watch.append((os.path.abspath(path), max_depth))
+    return watch
+
+def is_partial_download(path):
+    return os.path.splitext(path)[1].lower() in PARTIAL_DOWNLOAD_EXTENSIONS
+
+def file_identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
 # Real-time protection monitor
 class RealTimeMonitor(QThread):
     threat_detected = pyqtSignal(str, str)
     
+    WATCH_TIMEOUT = 1.0  # Seconds between stop checks while idle
+    REFRESH_INTERVAL = 5.0  # Seconds between signature and rule reload checks
+    WATCH_SETUP_BATCH = 64  # Directories added per loop pass while expanding the watch set
+    STATE_LOG_INTERVAL = 600.0  # Seconds between logs of the per-file state size
+    
     def __init__(self):
         super().__init__()
         self.running = False
-        self.signatures = load_signatures()
         self.settings = load_settings()
-        self.excluded_paths = self.settings.get("excluded_paths", [])
-        self.watched_extensions = [".exe", ".dll", ".bat", ".vbs", ".ps1", ".js", ".jar"]
+        self.exclusions = ExclusionMatcher(get_exclusions(self.settings))
+        self.file_states = MonitorState(
+            self.settings.get("realtime_state_max_entries", DEFAULT_MONITOR_STATE_ENTRIES),
+            self.settings.get("realtime_state_max_age", DEFAULT_MONITOR_STATE_MAX_AGE))
+        self.settle_time = max(0.0, float(self.settings.get("realtime_settle_seconds", DEFAULT_REALTIME_SETTLE_SECONDS)))
+        self.max_watches = int(self.settings.get("realtime_max_watches", DEFAULT_REALTIME_MAX_WATCHES))
+        # Watched directory -> subdirectory levels still allowed below it
+        self.watched = {}
+        # Natively recursive roots as (path, max_depth)
+        self.recursive_roots = []
+        # (directory, levels allowed below it, queue its files) waiting to be watched
+        self.pending_dirs = deque()
         
     def run(self):
         self.running = True
         log_activity("Real-time protection started")
         
-        # Monitor common directories
-        watched_dirs = [
-            os.path.join(os.environ["USERPROFILE"], "Downloads"),
-            os.path.join(os.environ["USERPROFILE"], "Desktop"),
-            os.environ["TEMP"]
-        ]
-        
-        last_scan_times = {}
+        scan_cache = open_scan_cache(self.settings)
+        watcher = create_file_watcher()
+        log_activity(f"Real-time protection using the {watcher.NAME} file watcher")
+        
+        # Paths waiting to be scanned, mapped to (due time, (size, mtime_ns) when
+        # queued). Repeated events for a path just push its due time back.
+        scan_queue = {}
+        self.watched = {}
+        self.recursive_roots = []
+        self.pending_dirs = deque()
+        for directory, max_depth in get_realtime_watch(self.settings):
+            if not os.path.isdir(directory):
+                continue
+                
+            # Skip excluded paths
+            if self.exclusions.matches(directory):
+                continue
+                
+            if watcher.NATIVE_RECURSION and max_depth > 0:
+                try:
+                    watcher.add_watch(directory, recursive=True)
+                    self.watched[directory] = max_depth
+                    self.recursive_roots.append((directory, max_depth))
+                    self.queue_directory(directory, scan_queue)
+                except Exception as e:
+                    log_activity(f"Error monitoring directory {directory}: {str(e)}", "ERROR")
+            elif self.watch_directory(watcher, directory, max_depth, False, scan_queue):
+                # Files that were already there when protection started are scanned
+                # for the roots only; subdirectories are watched from here on
+                self.queue_directory(directory, scan_queue)
         
+        last_refresh = 0
+        last_state_log = time.time()
         while self.running:
-            for directory in watched_dirs:
-                if not os.path.exists(directory):
+            if time.time() - last_state_log >= self.STATE_LOG_INTERVAL:
+                self.log_state()
+                last_state_log = time.time()
+            
+            # Grow the watch set a batch at a time so a large tree never stalls event handling
+            if self.pending_dirs:
+                self.expand_watches(watcher, scan_queue)
+            
+            timeout = self.WATCH_TIMEOUT
+            if self.pending_dirs:
+                timeout = 0
+            elif scan_queue:
+                next_due = min(due for due, _ in scan_queue.values())
+                timeout = min(timeout, max(0.0, next_due - time.time()))
+            
+            # Coalesce the batch so each path is looked at once, keeping its last event
+            changed = {}
+            for event, path, is_dir in watcher.read_events(timeout):
+                if event == "overflow":
+                    # Events were dropped, look at everything again
+                    for directory in list(self.watched):
+                        self.queue_directory(directory, scan_queue, settle=True)
+                elif event == "delete":
+                    changed.pop(path, None)
+                    scan_queue.pop(path, None)
+                    self.file_states.forget(path)
+                    if is_dir or path in self.watched:
+                        self.unwatch_tree(watcher, path)
+                elif is_dir:
+                    # New or moved in subdirectory, watched if the depth limit allows.
+                    # Other directory events just mean a child changed and carry no work.
+                    scan_queue.pop(path, None)
+                    if event not in ("create", "moved_to"):
+                        continue
+                    levels = self.watch_levels(os.path.dirname(path))
+                    if levels is not None and levels > 0 and path not in self.watched \
+                            and len(self.watched) < self.max_watches and not self.exclusions.matches(path):
+                        if watcher.NATIVE_RECURSION:
+                            self.queue_directory(path, scan_queue, settle=True)
+                        else:
+                            self.pending_dirs.appendleft((path, levels - 1, True))
+                elif self.watch_levels(os.path.dirname(path)) is None:
+                    # Below the depth limit of a natively recursive root
                     continue
-                    
-                # Skip excluded paths
-                if any(os.path.abspath(directory).startswith(os.path.abspath(excluded)) for excluded in self.excluded_paths):
+                elif is_partial_download(path):
+                    # Scanned under its final name after the rename
                     continue
-                    
-                try:
-                    for filename in os.listdir(directory):
-                        file_path = os.path.join(directory, filename)
-                        
-                        # Only scan files with watched extensions
-                        _, ext = os.path.splitext(file_path)
-                        if ext.lower() not in self.watched_extensions:
-                            continue
-                            
-                        # Skip if file was recently scanned (within last 5 minutes)
-                        if file_path in last_scan_times:
-                            if time.time() - last_scan_times[file_path] < 300:  # 5 minutes
-                                continue
-                        
-                        # Skip excluded paths
-                        if any(os.path.abspath(file_path).startswith(os.path.abspath(excluded)) for excluded in self.excluded_paths):
-                            continue
-                            
-                        # Only scan new or modified files
-                        if os.path.isfile(file_path):
-                            try:
-                                # Record scan time
-                                last_scan_times[file_path] = time.time()
-                                
-                                # Scan the file
-                                with open(file_path, 'rb') as f:
-                                    data = f.read()
-                                    md5_hash = hashlib.md5(data).hexdigest()
-                                    sha1_hash = hashlib.sha1(data).hexdigest()
-                                    sha256_hash = hashlib.sha256(data).hexdigest()
-                                
-                                # Check against known signatures
-                                if (md5_hash in self.signatures["md5"] or 
-                                    sha1_hash in self.signatures["sha1"] or 
-                                    sha256_hash in self.signatures["sha256"]):
-                                    self.threat_detected.emit(file_path, "Malware signature match")
-                                    log_activity(f"Real-time protection: Malware detected in {file_path}", "WARNING")
-                                    continue
-                                
-                                # Basic heuristic analysis
-                                suspicious_patterns = [
-                                    b"CreateRemoteThread",
-                                    b"VirtualAllocEx",
-                                    b"WriteProcessMemory",
-                                    b"ShellExecute",
-                                    b"WScript.Shell",
-                                    b"cmd.exe /c",
-                                    b"powershell -e",
-                                    b"net user /add",
-                                    b"reg add HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Run"
-                                ]
-                                
-                                for pattern in suspicious_patterns:
-                                    if pattern in data:
-                                        self.threat_detected.emit(file_path, "Suspicious behavior detected")
-                                        log_activity(f"Real-time protection: Suspicious file detected in {file_path}", "WARNING")
-                                        break
-                                        
-                            except Exception as e:
-                                log_activity(f"Error in real-time scan of {file_path}: {str(e)}", "ERROR")
-                except Exception as e:
-                    log_activity(f"Error monitoring directory {directory}: {str(e)}", "ERROR")
+                elif not self.exclusions.matches(path):
+                    changed[path] = event
+            
+            now = time.time()
+            for path, event in changed.items():
+                if event in SETTLED_EVENTS:
+                    scan_queue[path] = (now, None)
+                else:
+                    scan_queue[path] = (now + self.settle_time, file_identity(path))
+            
+            ready = [path for path, (due, _) in scan_queue.items() if due <= now]
+            if not ready:
+                if not scan_queue:
+                    # Age out entries while idle
+                    self.file_states.prune()
+                continue
+            
+            # Pick up signature and rule updates made by other processes
+            if now - last_refresh >= self.REFRESH_INTERVAL:
+                signature_handle.refresh()
+                get_heuristic_rules()
+                yara_engine.refresh(self.settings)
+                last_refresh = time.time()
+            
+            for file_path in ready:
+                if not self.running:
+                    break
+                _, identity = scan_queue.pop(file_path)
+                
+                # Still growing without telling us (polling, Windows): wait another quiet period
+                if identity is not None:
+                    current = file_identity(file_path)
+                    if current is not None and current != identity:
+                        scan_queue[file_path] = (time.time() + self.settle_time, current)
+                        continue
+                
+                self.scan_file(file_path, scan_cache)
+            
+            if scan_cache is not None:
+                scan_cache.flush()
+        
+        watcher.close()
+        if scan_cache is not None:
+            scan_cache.close()
+        
+        self.log_state()
+    
+    def log_state(self):
+        stats = self.file_states.statistics()
+        log_activity(f"Real-time protection state: {stats['entries']} files, {stats['memory_bytes'] // 1024} KB, "
+                     f"{stats['evicted']} evicted, {len(self.watched)} directories watched")
+    
+    def watch_levels(self, directory):
+        # Subdirectory levels still allowed below a directory, None if it is not watched
+        levels = self.watched.get(directory)
+        if levels is not None:
+            return levels
+        for root, max_depth in self.recursive_roots:
+            try:
+                relative = os.path.relpath(directory, root)
+            except ValueError:
+                # Different drive
+                continue
+            if relative == os.curdir:
+                return max_depth
+            if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+                continue
+            levels = max_depth - (relative.count(os.sep) + 1)
+            return levels if levels >= 0 else None
+        return None
+    
+    def expand_watches(self, watcher, scan_queue):
+        for _ in range(self.WATCH_SETUP_BATCH):
+            if not self.pending_dirs:
+                return
+            directory, levels, queue_files = self.pending_dirs.popleft()
+            if directory in self.watched:
+                continue
+            if len(self.watched) >= self.max_watches:
+                log_activity(f"Real-time protection watch limit of {self.max_watches} directories reached, "
+                             f"{len(self.pending_dirs) + 1} not watched", "WARNING")
+                self.pending_dirs.clear()
+                return
+            self.watch_directory(watcher, directory, levels, queue_files, scan_queue)
+    
+    # Watch one directory and line up its subdirectories. queue_files is set for
+    # trees that appeared at runtime, whose files may predate the watch.
+    def watch_directory(self, watcher, directory, levels, queue_files, scan_queue):
+        try:
+            watcher.add_watch(directory)
+        except Exception as e:
+            log_activity(f"Error monitoring directory {directory}: {str(e)}", "ERROR")
+            return False
+        self.watched[directory] = levels
+        if queue_files:
+            self.queue_directory(directory, scan_queue, settle=True)
+        if levels <= 0:
+            return True
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and not self.exclusions.matches(entry.path):
+                        self.pending_dirs.append((entry.path, levels - 1, queue_files))
+        except OSError as e:
+            log_activity(f"Error monitoring directory {directory}: {str(e)}", "ERROR")
+        return True
+    
+    def unwatch_tree(self, watcher, directory):
+        prefix = directory + os.sep
+        for watched in [path for path in self.watched if path == directory or path.startswith(prefix)]:
+            watcher.remove_watch(watched)
+            del self.watched[watched]
+    
+    # Queue the files in a directory. With settle set they may still be being
+    # written, so they wait a quiet period against a size/mtime snapshot.
+    def queue_directory(self, directory, scan_queue, settle=False):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.path in scan_queue or not entry.is_file() or is_partial_download(entry.path) \
+                            or self.exclusions.matches(entry.path):
+                        continue
+                    if settle:
+                        stat = entry.stat()
+                        scan_queue[entry.path] = (time.time() + self.settle_time, (stat.st_size, stat.st_mtime_ns))
+                    else:
+                        scan_queue[entry.path] = (0, None)
+        except OSError as e:
+            log_activity(f"Error monitoring directory {directory}: {str(e)}", "ERROR")
+    
+    def scan_file(self, file_path, scan_cache):
+        # Only scan new or modified files
+        if not os.path.isfile(file_path):
+            self.file_states.forget(file_path)
+            return
+            
+        try:
+            # Unchanged since the last scan
+            stat = os.stat(file_path)
+            if self.file_states.unchanged(file_path, stat):
+                return
+            self.file_states.record(file_path, stat)
+            
+            # Skip reading the file if its cached verdict is still valid
+            signatures = signature_handle.current()
+            if scan_cache is not None:
+                cached = scan_cache.lookup(file_path, stat, detection_version(signatures))
+                if cached is not None and cached["stale"]:
+                    cached["verdict"] = refresh_cached_verdict(cached, signatures)
+                    if cached["verdict"] is None:
+                        cached = None
+                if cached is not None:
+                    if cached["verdict"]:
+                        self.threat_detected.emit(file_path, cached["verdict"])
+                    return
+            
+            # Scan the file
+            hashes, heuristic, file_type, pe_info = analyze_file_contents(file_path)
+            heuristic_engine.record(heuristic["timings"], heuristic["rule_hits"])
             
-            # Sleep to reduce CPU usage
-            time.sleep(2)
+            # Check against known signatures, then YARA rules (skipped for inert file types)
+            verdict = ""
+            yara_matches = []
+            if signatures.match(hashes):
+                verdict = "Malware signature match"
+                log_activity(f"Real-time protection: Malware detected in {file_path}", "WARNING")
+            else:
+                if file_type not in HASH_ONLY_FILE_TYPES:
+                    yara_matches = yara_engine.match(file_path, stat.st_size)
+                if yara_matches:
+                    verdict = "YARA rule match"
+                    log_activity(f"Real-time protection: YARA rule match in {file_path} ({', '.join(yara_matches)})", "WARNING")
+                # Basic heuristic analysis
+                elif heuristic["detected"]:
+                    verdict = "Suspicious behavior detected"
+                    matched = ", ".join(f"{name}@{offset}" for offset, name in heuristic["findings"])
+                    matched = f"score {heuristic['score']}: {matched}"
+                    if pe_info is not None and pe_info["imphash"]:
+                        matched += f", imphash {pe_info['imphash']}"
+                    log_activity(f"Real-time protection: Suspicious file detected in {file_path} ({matched})", "WARNING")
+            
+            # Report before caching so a busy cache can never hide a threat
+            if verdict:
+                self.threat_detected.emit(file_path, verdict)
+            if scan_cache is not None:
+                scan_cache.store(file_path, stat, hashes, verdict, detection_version(signatures))
+                    
+        except Exception as e:
+            # Try again on the next event for this file
+            self.file_states.forget(file_path)
+            log_activity(f"Error in real-time scan of {file_path}: {str(e)}", "ERROR")
     
     def stop(self):
         self.running = False
@@ -619,13 +3462,15 @@ def check_disk_space():
 def check_startup_items():
     startup_items = []
     try:
-        # Check registry startup locations
-        reg_locations = [
-            (winreg.HKEY_CURRENT_USER, "Software\\Microsoft\\Windows\\CurrentVersion\\Run"),
-            (winreg.HKEY_LOCAL_MACHINE, "Software\\Microsoft\\Windows\\CurrentVersion\\Run"),
-            (winreg.HKEY_CURRENT_USER, "Software\\Microsoft\\Windows\\CurrentVersion\\RunOnce"),
-            (winreg.HKEY_LOCAL_MACHINE, "Software\\Microsoft\\Windows\\CurrentVersion\\RunOnce")
-        ]
+        # Check registry startup locations (Windows only)
+        reg_locations = []
+        if winreg is not None:
+            reg_locations = [
+                (winreg.HKEY_CURRENT_USER, "Software\\Microsoft\\Windows\\CurrentVersion\\Run"),
+                (winreg.HKEY_LOCAL_MACHINE, "Software\\Microsoft\\Windows\\CurrentVersion\\Run"),
+                (winreg.HKEY_CURRENT_USER, "Software\\Microsoft\\Windows\\CurrentVersion\\RunOnce"),
+                (winreg.HKEY_LOCAL_MACHINE, "Software\\Microsoft\\Windows\\CurrentVersion\\RunOnce")
+            ]
         
         for hkey, key_path in reg_locations:
             try:
@@ -644,8 +3489,8 @@ def check_startup_items():
                 
         # Check startup folders
         startup_folders = [
-            os.path.join(os.environ["APPDATA"], "Microsoft\\Windows\\Start Menu\\Programs\\Startup"),
-            os.path.join(os.environ["ProgramData"], "Microsoft\\Windows\\Start Menu\\Programs\\Startup")
+            os.path.join(os.environ.get("APPDATA", ""), "Microsoft\\Windows\\Start Menu\\Programs\\Startup"),
+            os.path.join(os.environ.get("ProgramData", ""), "Microsoft\\Windows\\Start Menu\\Programs\\Startup")
         ]
         
         for folder in startup_folders:
@@ -1078,6 +3923,11 @@ class MainWindow(QMainWindow):
         update_btn.clicked.connect(self.check_for_updates)
         actions_layout.addWidget(update_btn, 1, 0)
         
+        incremental_scan_btn = QPushButton("Incremental Scan")
+        incremental_scan_btn.setIcon(self.style().standardIcon(QApplication.style().SP_DialogApplyButton))
+        incremental_scan_btn.clicked.connect(lambda: self.start_scan("incremental"))
+        actions_layout.addWidget(incremental_scan_btn, 2, 0)
+        
         health_check_btn = QPushButton("System Health Check")
         health_check_btn.setIcon(self.style().standardIcon(QApplication.style().SP_ComputerIcon))
         health_check_btn.clicked.connect(self.run_health_check)
@@ -1142,6 +3992,11 @@ class MainWindow(QMainWindow):
         full_scan_radio.setToolTip("Scans your entire system for threats (may take a long time)")
         options_layout.addWidget(full_scan_radio)
         
+        # Incremental scan option
+        incremental_scan_radio = QRadioButton("Incremental Scan")
+        incremental_scan_radio.setToolTip("Scans only files added or modified since the last scan")
+        options_layout.addWidget(incremental_scan_radio)
+        
         # Custom scan option
         custom_scan_radio = QRadioButton("Custom Scan")
         custom_scan_radio.setToolTip("Select specific files or folders to scan")
@@ -1181,6 +4036,7 @@ class MainWindow(QMainWindow):
         start_scan_btn.clicked.connect(lambda: self.start_scan(
             "quick" if quick_scan_radio.isChecked() else 
             "full" if full_scan_radio.isChecked() else 
+            "incremental" if incremental_scan_radio.isChecked() else 
             "custom",
             self.custom_scan_path.text() if custom_scan_radio.isChecked() else "",
             scan_archives_cb.isChecked()
@@ -1199,6 +4055,10 @@ class MainWindow(QMainWindow):
         self.scan_status_label = QLabel("Ready to scan")
         progress_layout.addWidget(self.scan_status_label)
         
+        # Live pipeline throughput while a scan runs
+        self.scan_stats_label = QLabel("")
+        progress_layout.addWidget(self.scan_stats_label)
+        
         # Cancel scan button
         self.cancel_scan_btn = QPushButton("Cancel Scan")
         self.cancel_scan_btn.setIcon(self.style().standardIcon(QApplication.style().SP_MediaStop))
@@ -1245,6 +4105,7 @@ class MainWindow(QMainWindow):
         # Store references to radio buttons
         self.quick_scan_radio = quick_scan_radio
         self.full_scan_radio = full_scan_radio
+        self.incremental_scan_radio = incremental_scan_radio
         self.custom_scan_radio = custom_scan_radio
         self.scan_archives_cb = scan_archives_cb
     
@@ -1445,6 +4306,11 @@ class MainWindow(QMainWindow):
             system_drive = os.environ.get("SystemDrive", "C:")
             paths = [system_drive + "\\"]
             self.scan_status_label.setText("Starting full system scan...")
+        elif scan_type == "incremental":
+            # Incremental scan checks only files added or modified since the last scan
+            system_drive = os.environ.get("SystemDrive", "C:")
+            paths = [system_drive + "\\"]
+            self.scan_status_label.setText("Starting incremental scan of changed files...")
         elif scan_type == "custom":
             # Custom scan checks user-specified location
             if not custom_path or not os.path.exists(custom_path):
@@ -1455,12 +4321,14 @@ class MainWindow(QMainWindow):
         
         # Clear previous results
         self.scan_results_list.clear()
+        self.scan_stats_label.setText("")
         
         # Start the scanner thread
-        self.scanner_thread = FileScannerThread(paths, scan_archives)
+        self.scanner_thread = FileScannerThread(paths, scan_archives, incremental=scan_type == "incremental")
         self.scanner_thread.update_progress.connect(self.update_scan_progress)
         self.scanner_thread.scan_complete.connect(self.scan_completed)
         self.scanner_thread.threat_found.connect(self.threat_detected)
+        self.scanner_thread.stage_stats.connect(self.update_scan_stats)
         self.scanner_thread.start()
         
         # Enable cancel button
@@ -1479,6 +4347,14 @@ class MainWindow(QMainWindow):
         self.scan_status_label.setText(status)
         self.statusBar().showMessage(f"Scanning... {current}/{total} files")
     
+    def update_scan_stats(self, stats):
+        walk, read, analyze = stats["walk"], stats["read"], stats["analyze"]
+        self.scan_stats_label.setText(
+            f"Listed {walk['directories']} folders ({walk['scandir_seconds']:.1f}s) | "
+            f"Read: {read['queue_depth']} queued, {read['mb_per_second']:.1f} MB/s | "
+            f"Analyze: {analyze['queue_depth']} queued, {analyze['items_per_second']:.1f} files/s | "
+            f"In flight: {stats['in_flight_bytes'] // (1024 * 1024)} MB")
+    
     def scan_completed(self, result):
         self.scan_progress_bar.setValue(100)
         self.scan_status_label.setText(f"Scan completed. Scanned {result['scanned_files']} files, found {result['infected_files']} threats.")
@@ -1696,21 +4572,21 @@ class MainWindow(QMainWindow):
         QTimer.singleShot(2000, self.finish_signature_update)
     
     def finish_signature_update(self):
-        # Simulate adding new signatures
-        global virus_signatures
-        
-        # Add some demo signatures if they don't exist
+        # Simulate a delta pack adding some demo signatures
         new_signatures = {
-            "test_malware_1": "e1a1d38bc042e13e8d2dcb7184641c5abe21e5836715a5c6cc4cd1be9ab781b8",
-            "test_malware_2": "b1a8d38bc042e13e8d2dcb7184641c5abe21e5836715a5c6cc4cd1be9ab781c9",
-            "test_ransomware": "c1a7d38bc042e13e8d2dcb7184641c5abe21e5836715a5c6cc4cd1be9ab781d0"
+            "sha256": [
+                "e1a1d38bc042e13e8d2dcb7184641c5abe21e5836715a5c6cc4cd1be9ab781b8",
+                "b1a8d38bc042e13e8d2dcb7184641c5abe21e5836715a5c6cc4cd1be9ab781c9",
+                "c1a7d38bc042e13e8d2dcb7184641c5abe21e5836715a5c6cc4cd1be9ab781d0"
+            ]
         }
         
-        for name, sig in new_signatures.items():
-            if name not in virus_signatures:
-                virus_signatures[name] = sig
-        
-        save_signatures()
+        delta = create_signature_delta(read_signature_manifest()["version"], add=new_signatures)
+        success, message = apply_signature_delta(delta)
+        if not success:
+            self.statusBar().showMessage(f"Signature update failed: {message}")
+            self.update_signatures_btn.setEnabled(True)
+            return
         
         self.statusBar().showMessage("Virus signatures updated successfully")
         self.update_signatures_btn.setEnabled(True)
@@ -1841,7 +4717,7 @@ def main():
     
     # Load settings and signatures
     load_settings()
-    load_signatures()
+    get_signature_store()
     
     # Create and show the application
     app = QApplication(sys.argv)
@@ -1869,5 +4745,26 @@ def main():
     
     sys.exit(app.exec_())
 
-if __name__ == "__main__":
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "--convert-signatures":
+    # Usage: ArcSentinel.py --convert-signatures [signatures.json] [signatures.db]
+    # Without an output path the database is installed for the scanner; with
+    # one it is only exported to that file.
+    setup_directories()
+    json_path = sys.argv[2] if len(sys.argv) > 2 else SIGNATURES_JSON_FILE
+    db_path = sys.argv[3] if len(sys.argv) > 3 else None
+    total = convert_signatures(json_path, db_path)
+    if db_path is None:
+        print(f"Converted {total} signatures and installed them as the active database")
+    else:
+        print(f"Exported {total} signatures to {db_path} (not installed; omit the output path to install)")
+elif __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "--rollback-signatures":
+    # Usage: ArcSentinel.py --rollback-signatures
+    # Undoes the last signature update, or the last database replacement
+    setup_directories()
+    success, message = rollback_signatures()
+    print(message)
+    sys.exit(0 if success else 1)
+elif __name__ == "__main__":
+    # Required for the optional scan worker processes in frozen builds
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
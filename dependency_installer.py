@@ -14,6 +14,8 @@ def is_module_installed(module_name):
             import_name = 'PyQt5.QtWidgets'
         elif module_name == 'yara-python':
             import_name = 'yara'
+        elif module_name == 'pyahocorasick':
+            import_name = 'ahocorasick'
         else:
             import_name = module_name.split('==')[0]  # Remove version if present
         
@@ -32,7 +34,8 @@ def install_dependencies():
         'pefile',
         'requests',
         'chardet',
-        'numpy'
+        'numpy',
+        'pyahocorasick'
     ]
     
     # Check if running from a PyInstaller bundle
@@ -0,0 +1,30 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# ArcSentinel keeps its data under %APPDATA% and resolves those paths on
+# import, so point it at a scratch directory before importing it
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="arcsentinel-tests-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The module builds its GUI classes on import, so the tests need PyQt5
+try:
+    import ArcSentinel
+except ImportError as e:
+    ArcSentinel = None
+    import_error = str(e)
+
+
+@pytest.fixture
+def arc():
+    if ArcSentinel is None:
+        pytest.skip(f"ArcSentinel cannot be imported here: {import_error}")
+    # Fresh data directory and no loaded signature store for every test
+    shutil.rmtree(ArcSentinel.DATABASE_PATH, ignore_errors=True)
+    ArcSentinel.setup_directories()
+    ArcSentinel.signature_handle.store = None
+    yield ArcSentinel
+    ArcSentinel.signature_handle.store = None
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(params=["python", "ahocorasick"])
+def matcher_class(request, arc, monkeypatch):
+    if request.param == "python":
+        # Force the pure-Python automaton
+        monkeypatch.setattr(arc, "ahocorasick", None)
+    elif arc.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    return arc.PatternMatcher
+
+
+def naive_matches(patterns, data):
+    found = []
+    for index, pattern in enumerate(patterns):
+        start = data.find(pattern)
+        while start != -1:
+            found.append((start, index))
+            start = data.find(pattern, start + 1)
+    return sorted(found)
+
+
+PATTERNS = [b"he", b"she", b"his", b"hers", b"CreateRemoteThread", b"\x00\xff\x00"]
+
+
+def test_find_all_matches_every_occurrence(matcher_class):
+    matcher = matcher_class(PATTERNS)
+    data = b"ushers and his CreateRemoteThread \x00\xff\x00\xff\x00 she"
+    assert sorted(matcher.find_all(data)) == naive_matches(PATTERNS, data)
+
+
+def test_python_backend_builds_automaton(arc, monkeypatch):
+    monkeypatch.setattr(arc, "ahocorasick", None)
+    matcher = arc.PatternMatcher(PATTERNS)
+    assert matcher.automaton is None
+    # Resuming from a returned state continues a match split across buffers
+    matches, state = matcher.scan(b"xxCreateRemote")
+    assert matches == [] and state != 0
+    matches, state = matcher.scan(b"Threadyy", state, base_offset=14)
+    assert matches == [(2, PATTERNS.index(b"CreateRemoteThread"))]
+
+
+def test_stream_finds_matches_across_chunk_boundaries(matcher_class):
+    matcher = matcher_class(PATTERNS)
+    data = os.urandom(5000) + b"CreateRemoteThread" + os.urandom(3000) + b"hers"
+    expected = {}
+    for offset, index in naive_matches(PATTERNS, data):
+        expected.setdefault(index, offset)
+    
+    for chunk_size in (1, 7, 4096):
+        stream = matcher.stream()
+        for start in range(0, len(data), chunk_size):
+            stream.feed(data[start:start + chunk_size])
+        assert stream.matches() == sorted((offset, index) for index, offset in expected.items())
+
+
+def test_empty_pattern_list(matcher_class):
+    matcher = matcher_class([])
+    assert matcher.find_all(b"anything") == []
+    stream = matcher.stream()
+    stream.feed(b"anything")
+    assert stream.matches() == []
@@ -0,0 +1,53 @@
+import hashlib
+import os
+
+
+def cache_file(arc, tmp_path, content):
+    path = tmp_path / "file.bin"
+    path.write_bytes(content)
+    digest = hashlib.sha256(content).hexdigest()
+    hashes = {"md5": hashlib.md5(content).hexdigest(), "sha1": hashlib.sha1(content).hexdigest(), "sha256": digest}
+    return str(path), os.stat(path), hashes
+
+
+def test_lookup_after_signature_update(arc, tmp_path):
+    path, stat, hashes = cache_file(arc, tmp_path, b"clean file\n")
+    cache = arc.ScanCache()
+    signatures = arc.get_signature_store()
+    cache.store(path, stat, hashes, "", arc.detection_version(signatures))
+    
+    cached = cache.lookup(path, stat, arc.detection_version(signatures))
+    assert cached["verdict"] == "" and not cached["stale"]
+    
+    version = arc.read_signature_manifest()["version"]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version, add={"sha256": [hashes["sha256"]]}))[0]
+    signatures = arc.signature_handle.current()
+    cached = cache.lookup(path, stat, arc.detection_version(signatures))
+    assert cached["stale"] and cached["hashes"] == hashes
+    assert arc.refresh_cached_verdict(cached, signatures) == "Malware signature match"
+    cache.close()
+
+
+def test_cached_signature_match_needs_rescan_once_removed(arc, tmp_path):
+    path, stat, hashes = cache_file(arc, tmp_path, b"was malware\n")
+    arc.get_signature_store()
+    version = arc.read_signature_manifest()["version"]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version, add={"sha256": [hashes["sha256"]]}))[0]
+    cache = arc.ScanCache()
+    cache.store(path, stat, hashes, "Malware signature match", arc.detection_version(arc.signature_handle.current()))
+    
+    assert arc.apply_signature_delta(arc.create_signature_delta(version + 1, remove={"sha256": [hashes["sha256"]]}))[0]
+    signatures = arc.signature_handle.current()
+    cached = cache.lookup(path, stat, arc.detection_version(signatures))
+    assert cached["stale"] and arc.refresh_cached_verdict(cached, signatures) is None
+    cache.close()
+
+
+def test_rule_changes_invalidate_entries(arc, tmp_path):
+    path, stat, hashes = cache_file(arc, tmp_path, b"some file\n")
+    cache = arc.ScanCache()
+    cache.store(path, stat, hashes, "", "1:yara-a:100")
+    assert cache.lookup(path, stat, "2:yara-a:100")["stale"]
+    assert cache.lookup(path, stat, "1:yara-b:100") is None
+    assert cache.lookup(path, stat, "1:yara-a:200") is None
+    cache.close()
@@ -0,0 +1,195 @@
+import bisect
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def random_digests(count, size):
+    return sorted(os.urandom(size) for _ in range(count))
+
+
+def test_signature_db_layout(arc, tmp_path):
+    digests = {"md5": random_digests(50, 16), "sha1": [], "sha256": random_digests(2000, 32)}
+    db_path = str(tmp_path / "signatures.db")
+    arc.write_signature_db(digests, db_path)
+    
+    with open(db_path, 'rb') as f:
+        data = f.read()
+    magic, db_format, prefix_bits, section_count = arc.SIGNATURE_DB_HEADER.unpack_from(data, 0)
+    assert (magic, db_format, prefix_bits) == (arc.SIGNATURE_DB_MAGIC, arc.SIGNATURE_DB_FORMAT, arc.SIGNATURE_PREFIX_BITS)
+    assert section_count == len(arc.SIGNATURE_ALGORITHMS)
+    
+    store = arc.SignatureStore(db_path)
+    table = store.tables["sha256"]
+    assert len(table) == 2000
+    # Jump table entry p is the first digest whose leading 16 bits are >= p
+    for prefix in (0, 1, 0x7fff, 0xffff):
+        index = int.from_bytes(data[table.table_offset + prefix * 4:table.table_offset + prefix * 4 + 4], "little")
+        assert index == bisect.bisect_left(digests["sha256"], prefix.to_bytes(2, "big"))
+    
+    assert all(digest in table for digest in digests["sha256"])
+    assert all(digest in store.tables["md5"] for digest in digests["md5"])
+    assert not any(os.urandom(32) in table for _ in range(200))
+    assert list(table) == digests["sha256"]
+    assert len(store.tables["sha1"]) == 0
+    store.data.close()
+
+
+def test_signature_db_written_from_iterators(arc, tmp_path):
+    digests = {"md5": random_digests(10, 16), "sha256": random_digests(3000, 32)}
+    arc.write_signature_db(digests, str(tmp_path / "list.db"))
+    arc.write_signature_db({algorithm: iter(values) for algorithm, values in digests.items()},
+                           str(tmp_path / "stream.db"))
+    assert (tmp_path / "list.db").read_bytes() == (tmp_path / "stream.db").read_bytes()
+
+
+def test_signature_db_rejects_other_formats(arc, tmp_path):
+    db_path = tmp_path / "bad.db"
+    db_path.write_bytes(b"XXXX" + bytes(64))
+    with pytest.raises(ValueError):
+        arc.SignatureStore(str(db_path))
+
+
+def test_bloom_filter_vectorised_build_matches_python(arc):
+    np = pytest.importorskip("numpy")
+    digests = [os.urandom(32) for _ in range(5000)]
+    python_bloom = arc.BloomFilter(100003, 7)
+    numpy_bloom = arc.BloomFilter(100003, 7)
+    for digest in digests:
+        python_bloom.add(digest)
+    numpy_bloom.add_digests(np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(-1, 32))
+    assert python_bloom.bits == numpy_bloom.bits
+    assert all(digest in numpy_bloom for digest in digests)
+
+
+def test_delta_checksum_is_verified(arc):
+    arc.get_signature_store()
+    delta = arc.create_signature_delta(arc.read_signature_manifest()["version"], add={"sha256": [sha256("a")]})
+    delta["add"]["sha256"].append(sha256("tampered"))
+    success, message = arc.apply_signature_delta(delta)
+    assert not success and "integrity" in message
+    assert arc.read_signature_manifest()["journal"] == []
+
+
+def test_delta_base_version_must_match(arc):
+    arc.get_signature_store()
+    version = arc.read_signature_manifest()["version"]
+    delta = arc.create_signature_delta(version + 5, add={"sha256": [sha256("a")]})
+    success, message = arc.apply_signature_delta(delta)
+    assert not success and "version" in message
+    assert arc.read_signature_manifest()["version"] == version
+
+
+def test_journal_replay(arc):
+    store = arc.get_signature_store()
+    version = arc.read_signature_manifest()["version"]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version, add={"sha256": [sha256("a"), sha256("b")]}))[0]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version + 1, remove={"sha256": [sha256("a")]}))[0]
+    
+    # The running handle got the deltas published...
+    store = arc.signature_handle.current()
+    assert store.version == str(version + 2)
+    assert not store.contains("sha256", sha256("a")) and store.contains("sha256", sha256("b"))
+    
+    # ...and a fresh process replays them from the journal
+    arc.signature_handle.store = None
+    store = arc.get_signature_store()
+    assert store.version == str(version + 2)
+    assert not store.contains("sha256", sha256("a")) and store.contains("sha256", sha256("b"))
+
+
+def test_corrupt_journal_falls_back_to_base(arc):
+    arc.get_signature_store()
+    version = arc.read_signature_manifest()["version"]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version, add={"sha256": [sha256("a")]}))[0]
+    
+    with open(arc.SIGNATURE_JOURNAL_FILE, 'r+b') as f:
+        data = f.read().replace(sha256("a").encode(), sha256("x").encode())
+        f.seek(0)
+        f.write(data)
+    
+    arc.signature_handle.store = None
+    store = arc.get_signature_store()
+    assert store.version == str(version)
+    assert not store.contains("sha256", sha256("a")) and not store.contains("sha256", sha256("x"))
+
+
+def test_rollback_after_compaction(arc):
+    arc.get_signature_store()
+    version = arc.read_signature_manifest()["version"]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version, add={"sha256": [sha256("a")]}))[0]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version + 1, add={"sha256": [sha256("b")]}))[0]
+    
+    assert arc.compact_signatures()
+    manifest = arc.read_signature_manifest()
+    assert manifest["journal"] == [] and manifest["base_version"] == version + 2
+    store = arc.signature_handle.current()
+    assert store.contains("sha256", sha256("a")) and store.contains("sha256", sha256("b"))
+    
+    # Undo the compaction: previous base and journal come back, same content
+    assert arc.rollback_signatures()[0]
+    manifest = arc.read_signature_manifest()
+    assert manifest["version"] == version + 2 and len(manifest["journal"]) == 2
+    store = arc.signature_handle.current()
+    assert store.contains("sha256", sha256("a")) and store.contains("sha256", sha256("b"))
+    
+    # Then the last delta
+    assert arc.rollback_signatures()[0]
+    store = arc.signature_handle.current()
+    assert store.version == str(version + 1)
+    assert store.contains("sha256", sha256("a")) and not store.contains("sha256", sha256("b"))
+
+
+def test_compaction_runs_in_background(arc, monkeypatch):
+    arc.get_signature_store()
+    version = arc.read_signature_manifest()["version"]
+    monkeypatch.setattr(arc, "SIGNATURE_JOURNAL_MAX_BYTES", 0)
+    
+    started = threading.Event()
+    release = threading.Event()
+    write_signature_db = arc.write_signature_db
+    
+    def slow_write(digests, db_path):
+        started.set()
+        release.wait(5)
+        write_signature_db(digests, db_path)
+    monkeypatch.setattr(arc, "write_signature_db", slow_write)
+    
+    assert arc.apply_signature_delta(arc.create_signature_delta(version, add={"sha256": [sha256("a")]}))[0]
+    assert started.wait(5)
+    # The update returned and the handle stays usable while compaction writes
+    assert arc.signature_handle.refresh().contains("sha256", sha256("a"))
+    release.set()
+    
+    deadline = time.time() + 5
+    while arc.read_signature_manifest()["journal"] and time.time() < deadline:
+        time.sleep(0.05)
+    assert arc.read_signature_manifest()["journal"] == []
+    assert arc.signature_handle.current().contains("sha256", sha256("a"))
+
+
+def test_compaction_skipped_when_database_changes(arc, monkeypatch):
+    arc.get_signature_store()
+    version = arc.read_signature_manifest()["version"]
+    assert arc.apply_signature_delta(arc.create_signature_delta(version, add={"sha256": [sha256("a")]}))[0]
+    
+    write_signature_db = arc.write_signature_db
+    
+    def write_then_update(digests, db_path):
+        write_signature_db(digests, db_path)
+        # Another update lands while the compacted database is being written
+        assert arc.apply_signature_delta(arc.create_signature_delta(version + 1, add={"sha256": [sha256("b")]}))[0]
+    monkeypatch.setattr(arc, "write_signature_db", write_then_update)
+    
+    assert not arc.compact_signatures()
+    manifest = arc.read_signature_manifest()
+    assert manifest["version"] == version + 2 and len(manifest["journal"]) == 2
+    store = arc.signature_handle.current()
+    assert store.contains("sha256", sha256("a")) and store.contains("sha256", sha256("b"))